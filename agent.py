@@ -1,4 +1,4 @@
-from pubmed import search_pmc_by_keyword, fetch_full_text_pmc, extract_methods_section, extract_metadata
+from pubmed import search_pmc_by_keyword, fetch_full_texts, extract_methods_section, parse_article
 from parser import LLMParser
 import xml.etree.ElementTree as ET
 
@@ -9,13 +9,17 @@ class EEGReviewAgent:
     def run(self, keywords):
         pmc_ids = search_pmc_by_keyword(keywords)
         results = []
+        full_texts, _, _ = fetch_full_texts(pmc_ids[:10])
         for pmc in pmc_ids[:10]:
-            xml = fetch_full_text_pmc(pmc)
+            xml = full_texts.get(pmc)
             if not xml: continue
-            methods = extract_methods_section(xml)
+            try:
+                article = parse_article(xml, pmc)
+            except ET.ParseError:
+                continue
+            methods = extract_methods_section(article)
             if not methods: continue
-            root = ET.fromstring(xml)
-            meta = extract_metadata(root, pmc)
+            meta = article.metadata
             record = self.parser.parse_methods(meta, methods)
             if record:
                 results.append(record)
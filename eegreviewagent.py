@@ -1,52 +1,301 @@
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ET
-from pubmed import search_pmc_by_keyword fetch_full_text, extract_metadata, extract_methods_section
+from pathlib import Path
+from pubmed import search_pmc_by_keyword, iter_pmc_ids, fetch_full_texts, parse_article, extract_methods_section
 from parser import LLMParser
+from utils.eutils import cache_stats
+from utils.manifest import RunManifest
 
 class EEGReviewAgent:
-    def __init__(self, hf_api_key):
+    def __init__(self, hf_api_key, manifest=None, backend="remote"):
+        """
+        Args:
+            hf_api_key (str): Hugging Face API key for the LLM parser.
+            manifest (RunManifest | str | Path): SQLite run manifest recording each article's
+                pipeline stage; with one, reruns skip completed work. None disables it.
+            backend (str): LLM parser backend: "remote", "transformers" or a local server URL.
+        """
         self.hf_api_key = hf_api_key
-        self.parser = LLMParser(hf_api_key)
+        self.parser = LLMParser(hf_api_key, backend=backend)
+        self.manifest = RunManifest(Path(manifest)) if isinstance(manifest, (str, Path)) else manifest
+
+    def _resume_ids(self, keywords, resume):
+        """Returns (run_id, PMC IDs) of the last unfinished run if resuming, else None."""
+        if self.manifest is None or not resume:
+            return None
+        last_run = self.manifest.last_unfinished_run(keywords)
+        if last_run is None:
+            print("[manifest] No unfinished run to resume, starting a new one")
+        else:
+            print(f"[manifest] Resuming run {last_run[0]} with {len(last_run[1])} PMC IDs")
+        return last_run
+
+    def _saved_record(self, pmc_id):
+        """Returns the manifest record of an article (None without a manifest or if unseen)."""
+        return self.manifest.get(pmc_id) if self.manifest is not None else None
+
+    def _record(self, stage, *args):
+        if self.manifest is not None:
+            getattr(self.manifest, f"mark_{stage}")(*args)
+
+    def run(self, keywords, mode="sequential", resume=False, **async_options):
+        """
+        Searches PMC for the keywords and extracts preprocessing info from each article.
+
+        Args:
+            keywords (List[str]): Search keywords.
+            mode (str): "sequential" processes one article at a time; "async" runs the
+                pipelined stages of `run_async` (extra keyword arguments are passed on).
+            resume (bool): With a manifest, continue the last unfinished run for these
+                keywords (same PMC IDs, completed articles skipped) instead of searching again.
+
+        Returns:
+            dict: PMC ID -> parsed record.
+        """
+        if mode == "async":
+            return asyncio.run(self.run_async(keywords, resume=resume, **async_options))
 
-    def run(self, keywords):
         results = {}
-        print(f"Formulating query for keywords: {keywords}")
-        pmc_ids = search_pmc_by_keyword(keywords)
-        print(f"[search_pmc] PMC IDs found: {pmc_ids}")
+        run = self._resume_ids(keywords, resume)
+        if run is not None:
+            run_id, pmc_ids = run
+        else:
+            print(f"Formulating query for keywords: {keywords}")
+            pmc_ids = search_pmc_by_keyword(keywords)
+            print(f"[search_pmc] PMC IDs found: {pmc_ids}")
+            self._record("searched", pmc_ids)
+            run_id = self.manifest.start_run(keywords, pmc_ids) if self.manifest is not None else None
+
+        saved = {pmc_id: self._saved_record(pmc_id) for pmc_id in pmc_ids}
+        to_fetch = [pmc_id for pmc_id, record in saved.items()
+                    if not (record and (self.manifest.is_done(record) or record["methods_text"]))]
+
+        print(f"Fetching full texts for {len(to_fetch)} PMC IDs...")
+        full_texts, _, failed = fetch_full_texts(to_fetch) if to_fetch else ({}, [], [])
 
         for pmc_id in pmc_ids:
-            print(f"\nFetching PMC ID: {pmc_id}")
-            xml = fetch_full_text(pmc_id)
-            if not xml:
-                print(f"  [Skip] No full text for {pmc_id}")
+            print(f"\nProcessing PMC ID: {pmc_id}")
+            record = saved[pmc_id]
+            if self.manifest is not None and self.manifest.is_done(record):
+                print(f"  [Manifest] Already done ({record['status']})")
+                if record["status"] == "parsed":
+                    results[pmc_id] = record["result"]
                 continue
 
-            methods_text = extract_methods_section(xml, verbose=True)
-            if not methods_text:
-                print(f"  [Skip] No methods section found in {pmc_id}")
-                continue
+            if record and record["methods_text"]:
+                print("  [Manifest] Reusing extracted methods section")
+                metadata, methods_text = record["metadata"], record["methods_text"]
+            else:
+                if pmc_id in failed:
+                    # Left pending in the manifest so a rerun fetches it again
+                    print(f"  [Skip] Fetch failed for {pmc_id}, will retry on the next run")
+                    continue
+                xml = full_texts.get(pmc_id)
+                self._record("fetched", pmc_id, xml)
+                if not xml:
+                    print(f"  [Skip] No full text for {pmc_id}")
+                    continue
+
+                try:
+                    article = parse_article(xml, pmc_id)
+                except ET.ParseError as e:
+                    print(f"  [Skip] XML parsing error in {pmc_id}: {e}")
+                    continue
+                self._record("filtered", pmc_id, article.is_research_article)
 
-            root = ET.fromstring(xml)
-            metadata = extract_metadata(root, pmc_id)
+                methods_text = extract_methods_section(article, verbose=True)
+                metadata = article.metadata
+                self._record("extracted", pmc_id, metadata, methods_text)
+                if not methods_text:
+                    print(f"  [Skip] No methods section found in {pmc_id}")
+                    continue
 
             # Parse methods with LLMParser
             print(f"  Parsing methods section with LLM parser...")
             parsed_data = self.parser.parse_methods(metadata, methods_text)
+            self._record("parsed", pmc_id, parsed_data)
 
             if parsed_data:
                 results[pmc_id] = parsed_data
             else:
                 print(f"  [Warning] LLM parser returned empty or invalid data for {pmc_id}")
 
+        if self.manifest is not None:
+            self.manifest.finish_run(run_id)
+            print(f"\n[manifest] {self.manifest.summary(pmc_ids)}")
+        print(f"\n[cache] E-utilities cache: {cache_stats()}")
         return results
 
+    async def run_async(self, keywords, fetch_batch_size=10, fetch_workers=4, extract_workers=2,
+                        llm_concurrency=4, queue_size=32, max_results=100, resume=False):
+        """
+        Pipelined version of `run`: fetch -> methods extraction -> LLM parse, with a bounded
+        queue between stages so downloads, XML parsing and LLM calls overlap.
+
+        E-utilities requests share the NCBI token bucket in utils.eutils, so adding fetch
+        workers raises throughput only up to the rate limit (3 req/s, 10 with NCBI_API_KEY).
+        Blocking work runs on a thread pool sized for every worker of every stage (plus the
+        search), so the concurrency settings are not capped by the loop's default executor.
+
+        Args:
+            keywords (List[str]): Search keywords.
+            fetch_batch_size (int): PMC IDs per efetch request.
+            fetch_workers (int): Concurrent efetch requests.
+            extract_workers (int): Concurrent methods-extraction tasks.
+            llm_concurrency (int): Maximum concurrent LLM parser requests.
+            queue_size (int): Capacity of each inter-stage queue.
+            max_results (int): Number of search hits to process (100 matches the sequential
+                path); None streams every hit from the esearch history server.
+            resume (bool): See `run`.
+
+        Returns:
+            dict: PMC ID -> parsed record, in search order (same as the sequential path).
+
+        Raises:
+            Exception: The first error raised by any stage; the other stages are cancelled and
+                the run is left unfinished in the manifest, so `resume` can continue it.
+        """
+        batch_queue = asyncio.Queue(maxsize=queue_size)
+        xml_queue = asyncio.Queue(maxsize=queue_size)
+        llm_queue = asyncio.Queue(maxsize=queue_size)
+        pmc_ids = []
+        parsed = {}
+        run = self._resume_ids(keywords, resume)
+        run_id = run[0] if run is not None else None
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=fetch_workers + extract_workers + llm_concurrency + 1,
+                                      thread_name_prefix="review")
+
+        def in_thread(func, *args):
+            return loop.run_in_executor(executor, func, *args)
+
+        async def dispatch(ids):
+            # Articles the manifest already has are finished or go straight to the LLM stage
+            to_fetch = []
+            for pmc_id in ids:
+                record = self._saved_record(pmc_id)
+                if self.manifest is not None and self.manifest.is_done(record):
+                    if record["status"] == "parsed":
+                        parsed[pmc_id] = record["result"]
+                elif record and record["methods_text"]:
+                    await llm_queue.put((pmc_id, record["metadata"], record["methods_text"]))
+                else:
+                    to_fetch.append(pmc_id)
+            for start in range(0, len(to_fetch), fetch_batch_size):
+                await batch_queue.put(to_fetch[start:start + fetch_batch_size])
+
+        async def search_stage():
+            nonlocal run_id
+            if run is not None:
+                pmc_ids.extend(run[1])
+                await dispatch(run[1])
+                return
+
+            print(f"Formulating query for keywords: {keywords}")
+            if self.manifest is not None:
+                run_id = self.manifest.start_run(keywords, [])
+            pages = iter_pmc_ids(keywords, max_results=max_results)
+            while (ids := await in_thread(next, pages, None)) is not None:
+                pmc_ids.extend(ids)
+                if self.manifest is not None:
+                    self.manifest.mark_searched(ids)
+                    self.manifest.add_run_ids(run_id, ids)
+                await dispatch(ids)
+
+        async def fetch_stage():
+            while (batch := await batch_queue.get()) is not None:
+                full_texts, _, failed = await in_thread(fetch_full_texts, batch, fetch_batch_size)
+                for pmc_id in batch:
+                    if pmc_id in failed:
+                        print(f"  [Skip] Fetch failed for {pmc_id}, will retry on the next run")
+                        continue
+                    xml = full_texts.get(pmc_id)
+                    self._record("fetched", pmc_id, xml)
+                    if xml:
+                        await xml_queue.put((pmc_id, xml))
+                    else:
+                        print(f"  [Skip] No full text for {pmc_id}")
+
+        def extract(pmc_id, xml):
+            try:
+                article = parse_article(xml, pmc_id)
+            except ET.ParseError:
+                return None
+            self._record("filtered", pmc_id, article.is_research_article)
+            methods_text = extract_methods_section(article)
+            self._record("extracted", pmc_id, article.metadata, methods_text)
+            if not methods_text:
+                return None
+            return article.metadata, methods_text
+
+        async def extract_stage():
+            while (item := await xml_queue.get()) is not None:
+                pmc_id, xml = item
+                extracted = await in_thread(extract, pmc_id, xml)
+                if extracted:
+                    await llm_queue.put((pmc_id, *extracted))
+                else:
+                    print(f"  [Skip] No methods section found in {pmc_id}")
+
+        async def llm_stage():
+            while (item := await llm_queue.get()) is not None:
+                pmc_id, metadata, methods_text = item
+                print(f"  Parsing methods section of {pmc_id} with LLM parser...")
+                parsed_data = await in_thread(self.parser.parse_methods, metadata, methods_text)
+                self._record("parsed", pmc_id, parsed_data)
+                if parsed_data:
+                    parsed[pmc_id] = parsed_data
+                else:
+                    print(f"  [Warning] LLM parser returned empty or invalid data for {pmc_id}")
+
+        async def drive():
+            # Search, then close each stage once the one feeding it has finished
+            await search_stage()
+            for workers, stage_queue in ((fetchers, batch_queue), (extractors, xml_queue), (parsers, llm_queue)):
+                for _ in workers:
+                    await stage_queue.put(None)
+                await asyncio.gather(*workers)
+
+        extractors = [asyncio.create_task(extract_stage()) for _ in range(extract_workers)]
+        parsers = [asyncio.create_task(llm_stage()) for _ in range(llm_concurrency)]
+        fetchers = [asyncio.create_task(fetch_stage()) for _ in range(fetch_workers)]
+        tasks = [asyncio.create_task(drive()), *fetchers, *extractors, *parsers]
+        try:
+            # A stage that raises would leave the stages feeding it blocked on full queues,
+            # so the first error cancels the whole pipeline and is raised to the caller
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in tasks:
+                if task in done and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.manifest is not None:
+            self.manifest.finish_run(run_id)
+            print(f"\n[manifest] {self.manifest.summary(pmc_ids)}")
+        print(f"\n[cache] E-utilities cache: {cache_stats()}")
+        return {pmc_id: parsed[pmc_id] for pmc_id in pmc_ids if pmc_id in parsed}
+
 
 if __name__ == "__main__":
+    import argparse
+    cli = argparse.ArgumentParser(description="Extract EEG preprocessing info from PMC articles.")
+    cli.add_argument("--manifest", help="SQLite run manifest; reruns skip completed articles")
+    cli.add_argument("--resume", action="store_true", help="continue the last unfinished run (needs --manifest)")
+    cli.add_argument("--backend", default="remote",
+                     help="LLM parser backend: remote, transformers or a local server URL (python -m utils.backends)")
+    args = cli.parse_args()
+
     hf_api_key = os.getenv("HF_API_KEY") or input("Enter your Hugging Face API key: ")
-    agent = EEGReviewAgent(hf_api_key)
+    agent = EEGReviewAgent(hf_api_key, manifest=args.manifest, backend=args.backend)
 
     keywords = ["EEG", "visual oddball"]
-    records = agent.run(keywords)
+    records = agent.run(keywords, resume=args.resume)
 
     if not records:
         print("\nNo methods sections extracted.")
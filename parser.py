@@ -1,7 +1,11 @@
 import os
-import requests
 import re
 import json
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils.backends import make_backend
+from utils.resultcache import cached_result
 
 # JSON schema template for EEG preprocessing
 JSON_TEMPLATE = {
@@ -31,13 +35,169 @@ JSON_TEMPLATE = {
     }
 }
 
+# Top-level fields filled from the article metadata rather than by the model
+METADATA_FIELDS = ("PMCID", "PMID", "title", "authors", "year")
+
+# Conflict rule per schema field when chunks of a long methods section disagree:
+# "majority" keeps the most frequent value (ties: the earliest chunk), "union" keeps every
+# distinct value in document order joined by "; ". Fields not listed use "union", since
+# chunks usually describe different steps (e.g. two filters applied at different stages).
+MERGE_RULES = {
+    "study.cohort": "majority",
+    "study.EEG channels": "majority",
+    "study.dual-layer EEG": "majority",
+    "study.EEG system": "majority",
+    "study.sampling frequency": "majority",
+    "preprocessing.downsampling": "majority",
+    "preprocessing.re-referencing": "majority",
+}
+
+# Rough characters per token, used when the backend has no tokenizer (remote and server backends)
+CHARS_PER_TOKEN = 4
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def estimate_tokens(text):
+    """Estimates the tokens of a text at CHARS_PER_TOKEN characters per token."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_into_chunks(text, budget, overlap, count_tokens):
+    """
+    Splits text into chunks of at most `budget` tokens at sentence boundaries; each chunk
+    repeats the last sentences (up to `overlap` tokens) of the previous one, so a parameter
+    described across a boundary is seen whole by at least one chunk.
+
+    Args:
+        text (str): Methods text.
+        budget (int): Maximum tokens per chunk.
+        overlap (int): Tokens carried over from the end of the previous chunk.
+        count_tokens (Callable[[str], int]): Token counter.
+
+    Returns:
+        List[str]: Chunks in document order.
+    """
+    sentences = []
+    for sentence in filter(None, (part.strip() for part in SENTENCE_END.split(text))):
+        if count_tokens(sentence) <= budget:
+            sentences.append(sentence)
+            continue
+        # A sentence longer than the budget (e.g. a flattened table) is cut into word runs
+        words = sentence.split()
+        step = max(1, len(words) * budget // count_tokens(sentence))
+        sentences.extend(" ".join(words[start:start + step]) for start in range(0, len(words), step))
+
+    lengths = [count_tokens(sentence) + 1 for sentence in sentences]
+    chunks, start = [], 0
+    while start < len(sentences):
+        end, used = start, 0
+        while end < len(sentences) and (end == start or used + lengths[end] <= budget):
+            used += lengths[end]
+            end += 1
+        chunks.append(" ".join(sentences[start:end]))
+        if end == len(sentences):
+            break
+        # Next chunk starts with the trailing sentences that fit in the overlap
+        next_start, carried = end, 0
+        while next_start - 1 > start and carried + lengths[next_start - 1] <= overlap:
+            next_start -= 1
+            carried += lengths[next_start]
+        start = next_start
+    return chunks
+
+
+def _as_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "; ".join(filter(None, map(_as_text, value)))
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value).strip()
+
+
+def merge_records(records, metadata=None, template=JSON_TEMPLATE, rules=MERGE_RULES, path=""):
+    """
+    Merges the records extracted from the chunks of one methods section into a single
+    record with exactly the schema's keys and string leaves.
+
+    Args:
+        records (List[dict]): Per-chunk records, in document order (keys outside the schema are dropped).
+        metadata (dict): Article metadata; fills METADATA_FIELDS when given.
+        template (dict): Schema (JSON_TEMPLATE or one of its sections).
+        rules (dict): Conflict rule per dotted field path (see MERGE_RULES).
+        path (str): Dotted path of `template` inside the full schema.
+
+    Returns:
+        dict: The merged record.
+    """
+    merged = {}
+    for key, default in template.items():
+        field = f"{path}{key}"
+        values = [record.get(key) for record in records if isinstance(record, dict)]
+        if isinstance(default, dict):
+            merged[key] = merge_records([value for value in values if isinstance(value, dict)], None,
+                                        default, rules, f"{field}.")
+            continue
+        if metadata is not None and not path and key in METADATA_FIELDS and metadata.get(key):
+            merged[key] = _as_text(metadata[key])
+            continue
+
+        found = [text for text in map(_as_text, values) if text]
+        # First spelling of each value, in order of first occurrence
+        first = {}
+        for text in found:
+            first.setdefault(text.casefold(), text)
+        distinct = list(first.values())
+        if len(distinct) <= 1:
+            merged[key] = distinct[0] if distinct else default
+        elif rules.get(field, "union") == "majority":
+            counts = Counter(text.casefold() for text in found)
+            merged[key] = max(distinct, key=lambda text: counts[text.casefold()])
+        else:
+            merged[key] = "; ".join(distinct)
+    return merged
+
+
 class LLMParser:
-    def __init__(self, hf_api_key, model_id="mistralai/Mistral-7B-Instruct-v0.1"):
-        self.endpoint = f"https://api-inference.huggingface.co/models/{model_id}"
-        self.headers = {"Authorization": f"Bearer {hf_api_key}"}
+    def __init__(self, hf_api_key=None, model_id="mistralai/Mistral-7B-Instruct-v0.1", backend="remote",
+                 context_tokens=8192, max_new_tokens=512, chunk_overlap=128, max_workers=4):
+        """
+        Args:
+            hf_api_key (str): Hugging Face API key (remote backend).
+            model_id (str): Hugging Face model ID.
+            backend: Where the model runs: "remote" (Hugging Face Inference API), "transformers"
+                (in-process model) or the URL of a local inference server (see utils.backends);
+                the local backends micro-batch concurrent requests into single forward passes.
+            context_tokens (int): Model context window. Methods sections whose prompt would not fit
+                (with room for max_new_tokens) are split into overlapping chunks that are extracted
+                concurrently and merged; None always sends the whole section in one prompt.
+            max_new_tokens (int): Tokens generated per request.
+            chunk_overlap (int): Tokens repeated between consecutive chunks.
+            max_workers (int): Concurrent chunk requests.
+        """
+        self.model_id = model_id
+        self.backend = make_backend(backend, model_id, hf_api_key)
+        self.hf_api_key = hf_api_key
+        self.context_tokens = context_tokens
+        self.max_new_tokens = max_new_tokens
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers
 
-    def parse_methods(self, metadata: dict, methods_text: str) -> dict:
-        prompt = f"""
+    def count_tokens(self, text):
+        """
+        Counts the tokens of a text with the backend's tokenizer when it has one (the in-process
+        backend), otherwise estimates them, so no tokenizer is downloaded for remote models.
+        """
+        count = getattr(self.backend, "count_tokens", None)
+        return count(text) if count is not None else estimate_tokens(text)
+
+    def build_prompt(self, metadata: dict, methods_text: str, part=None) -> str:
+        """Builds the extraction prompt; `part` is (index, count) when the text is one chunk of the section."""
+        section = "Methods Section:" if part is None else \
+            f"Methods Section (part {part[0]} of {part[1]}; fill only fields described in this part):"
+        return f"""
 You are an EEG preprocessing extraction assistant. Given the following metadata and Methods section, return an exact JSON matching the schema below. If a field isn't present, leave it as an empty string.
 
 Schema:
@@ -50,23 +210,57 @@ title: {metadata.get('title','')}
 authors: {metadata.get('authors','')}
 year: {metadata.get('year','')}
 
-Methods Section:
+{section}
 {methods_text}
 
 Return ONLY valid JSON following the schema.
 """
-        payload = {
-            "inputs": prompt,
-            "parameters": {"max_new_tokens": 512, "temperature": 0.1},
-            "options": {"wait_for_model": True}
-        }
-        resp = requests.post(self.endpoint, headers=self.headers, json=payload, timeout=60)
-        try:
-            out = resp.json()
-            if isinstance(out, dict) and "error" in out:
-                raise ValueError(out["error"])
 
-            text = out[0]["generated_text"]
+    def parse_methods(self, metadata: dict, methods_text: str) -> dict:
+        """
+        Extracts the schema fields of a methods section, chunking it if it does not fit the context.
+
+        Returns:
+            dict: A record with exactly the JSON_TEMPLATE keys (see `merge_records`), or {} on failure.
+        """
+        if self.context_tokens:
+            # Budget for the methods text: context minus the generated tokens and the rest of the prompt
+            # (built with the longest part label, so every chunk prompt fits)
+            overhead = self.count_tokens(self.build_prompt(metadata, "", part=(999, 999)))
+            budget = self.context_tokens - self.max_new_tokens - overhead
+            if budget <= self.chunk_overlap:
+                raise ValueError(f"context_tokens={self.context_tokens} leaves no room for the methods text")
+            if self.count_tokens(methods_text) > budget:
+                return self.parse_chunked(metadata, methods_text, budget)
+        # Normalized like the chunked path, so the output shape does not depend on text length
+        record = self._parse_prompt(self.build_prompt(metadata, methods_text))
+        return merge_records([record], metadata) if record else {}
+
+    def parse_chunked(self, metadata: dict, methods_text: str, budget: int) -> dict:
+        """
+        Map-reduce extraction of a methods section longer than the token budget: overlapping
+        chunks are extracted concurrently and their records merged with `merge_records`.
+
+        Returns:
+            dict: The merged record, or {} if no chunk could be parsed.
+        """
+        chunks = split_into_chunks(methods_text, budget, self.chunk_overlap, self.count_tokens)
+        print(f"[parser] Methods text of {metadata.get('PMCID', '?')} split into {len(chunks)} chunks")
+        prompts = [self.build_prompt(metadata, chunk, part=(index, len(chunks)))
+                   for index, chunk in enumerate(chunks, start=1)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            records = [record for record in executor.map(self._parse_prompt, prompts) if record]
+        return merge_records(records, metadata) if records else {}
+
+    def _parse_prompt(self, prompt):
+        parameters = {"max_new_tokens": self.max_new_tokens, "temperature": 0.1}
+        # Unchanged prompts are answered from the shared result cache; failed calls ({}) are not cached
+        return cached_result(self.backend.cache_id, parameters, JSON_TEMPLATE, prompt,
+                             lambda prompt: self._query(prompt, parameters), keep=bool)
+
+    def _query(self, prompt, parameters):
+        try:
+            text = self.backend.generate(prompt, parameters)
 
             # Extract JSON from text (attempt to find {...} block)
             json_match = re.search(r"\{.*\}", text, re.DOTALL)
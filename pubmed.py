@@ -1,97 +1,92 @@
-import requests
 import xml.etree.ElementTree as ET
-import re
-from thefuzz import fuzz
+from utils.mesh import mesh_expander
+from utils.sectiontitles import MethodsTitleClassifier
+from utils.article import ParsedArticle, iter_articles, section_text
+from utils.eutils import eutils_request, efetch_pmc_batch, normalize_pmc_id, HistorySearch, EFETCH_BATCH_SIZE, ESEARCH_PAGE_SIZE
 
 SIMILARITY_THRESHOLD = 65
 METHODS_TITLES = {"methods", "materials and methods", "methodology", "experimental procedure"}
+title_classifier = MethodsTitleClassifier(METHODS_TITLES, SIMILARITY_THRESHOLD)
 
 def get_mesh_terms(keyword):
-    try:
-        url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=mesh&term={keyword}&retmode=xml"
-        resp = requests.get(url, timeout=10)
-        root = ET.fromstring(resp.content)
-        qt = root.find('.//QueryTranslation')
-        if qt is None:
-            return []
-        return re.findall(r'"([^"]+)"\[MeSH Terms\]', qt.text)[:5]
-    except Exception as e:
-        print(f"[MeSH] Error: {e}")
-        return []
+    return mesh_expander.terms(keyword)
 
 def build_enhanced_query(keywords):
-    parts = []
-    for kw in keywords:
-        mesh = get_mesh_terms(kw)
-        terms = [f'"{kw}"[Title/Abstract]'] + [f'"{m}"[MeSH Terms]' for m in mesh]
-        parts.append("(" + " OR ".join(terms) + ")")
-    return " AND ".join(parts)
+    return mesh_expander.build_query(keywords)
 
 def search_pmc_by_keyword(keywords):
     query = build_enhanced_query(keywords)
     query += " AND open access[filter]"
-    url = (
-        "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        f"?db=pmc&term={requests.utils.quote(query)}&retmode=xml&retmax=100"
-    )
-    resp = requests.get(url)
-    root = ET.fromstring(resp.content)
+    content = eutils_request("esearch", {"db": "pmc", "term": query, "retmode": "xml", "retmax": 100}, kind="search")
+    root = ET.fromstring(content)
     ids = [id_tag.text for id_tag in root.findall('.//IdList/Id')]
     print(f"[search_pmc] PMC IDs found: {ids}")
     return ids
 
+def search_pmc_history(keywords):
+    query = build_enhanced_query(keywords)
+    query += " AND open access[filter]"
+    return HistorySearch(query)
+
+def iter_pmc_ids(keywords, page_size=ESEARCH_PAGE_SIZE, max_results=None):
+    search = search_pmc_history(keywords)
+    for ids in search.id_pages(page_size=page_size, max_results=max_results):
+        print(f"[iter_pmc_ids] Page of {len(ids)} PMC IDs ({search.count} hits in total)")
+        yield ids
+
 def fetch_full_text(pmc_id):
-    url = (
-        "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-        f"?db=pmc&id={pmc_id}&retmode=xml"
-    )
-    resp = requests.get(url)
-    if resp.status_code != 200 or not resp.text.strip().startswith('<?xml'):
-        print(f"[fetch_full_text_pmc] Bad XML or HTTP {resp.status_code} for {pmc_id}")
-        return None
-    return resp.text
+    articles, _, _ = efetch_pmc_batch([pmc_id])
+    xml = articles.get(normalize_pmc_id(pmc_id))
+    if xml is None:
+        print(f"[fetch_full_text_pmc] No article XML returned for {pmc_id}")
+    return xml
 
-def extract_methods_section(xml_content, verbose=False):
-    try:
-        root = ET.fromstring(xml_content)
-        methods_sections = []  # ← This is the missing line
-
-        for sec in root.findall(".//sec"):
-            title_elem = sec.find("title")
-            if title_elem is not None and title_elem.text:
-                title = title_elem.text.strip()
-                score = max(fuzz.ratio(title.lower(), mt) for mt in METHODS_TITLES)
-                if verbose:
-                    print(f"    Title: {title} | Match score: {score}")
-                if score >= SIMILARITY_THRESHOLD:
-                    section_text = extract_text_from_section(sec)
-                    if section_text:
-                        methods_sections.append(section_text)
-            elif verbose:
-                print("    [Skip] Section without title")
+def fetch_full_texts(pmc_ids, batch_size=EFETCH_BATCH_SIZE):
+    articles, missing, failed = efetch_pmc_batch(pmc_ids, batch_size=batch_size)
+    if missing:
+        print(f"[fetch_full_texts] No full text returned for: {missing}")
+    if failed:
+        print(f"[fetch_full_texts] Fetch failed, retry later: {failed}")
+    return articles, missing, failed
 
-        return "\n\n".join(methods_sections) if methods_sections else None
+def methods_title_score(title):
+    return title_classifier.score(title)
 
+def is_methods_title(title, sec=None):
+    return title_classifier.is_methods_title(title)
+
+def parse_article(xml_content, pmc_id=None):
+    if isinstance(xml_content, ParsedArticle):
+        return xml_content
+    return ParsedArticle.from_xml(xml_content, pmc_id)
+
+def extract_methods_section(xml_content, verbose=False):
+    try:
+        article = parse_article(xml_content)
     except ET.ParseError as e:
         if verbose:
             print(f"  XML parsing error: {e}")
         return None
 
+    title_classifier.classify_many(title for title, _ in article.sections)
+    if verbose:
+        for title, _ in article.sections:
+            if title:
+                print(f"    Title: {title.strip()} | Match score: {methods_title_score(title)}")
+            else:
+                print("    [Skip] Section without title")
+
+    return article.methods_text(is_methods_title, extract_text_from_section)
+
+
+def iter_methods_sections(source):
+    for article in iter_articles(source, is_methods_title):
+        yield article, article.methods_text(is_methods_title, extract_text_from_section)
+
 
 def extract_text_from_section(section):
-    lines = []
-    for elem in section.iter():
-        if elem.tag not in ("title", "sec"):
-            if elem.text and elem.text.strip():
-                lines.append(elem.text.strip())
-            if elem.tail and elem.tail.strip():
-                lines.append(elem.tail.strip())
-    return "\n".join(lines).strip()
+    return section_text(section)
 
 def extract_metadata(root, pmc_id):
-    pmid = root.findtext('.//article-id[@pub-id-type="pmid"]', default="")
-    title = root.findtext('.//article-title', default="")
-    authors = [" ".join(filter(None, [a.findtext('given-names',''), a.findtext('surname','')])) 
-               for a in root.findall('.//contrib[@contrib-type="author"]')]
-    year = root.findtext('.//pub-date/year','')
-    return {"PMCID": pmc_id, "PMID": pmid, "title": title, "authors": authors, "year": year}
+    article = root if isinstance(root, ParsedArticle) else ParsedArticle(root, pmc_id)
+    return article.metadata
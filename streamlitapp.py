@@ -1,36 +1,91 @@
 import streamlit as st
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
-import PyPDF2
-import tempfile
+import hashlib
+import threading
+from collections import OrderedDict
 import pandas as pd
+from utils.passages import PassageSelector
+from utils.pdftext import pdf_text, find_methods_region
+from utils.resultcache import cached_results
+
+MODEL_NAME = "google/flan-t5-base"
+GENERATION_PARAMS = {"max_new_tokens": 100, "max_length": 1024}
+
+# (document, question) answers kept in memory; older ones are still in the persistent result cache
+ANSWER_MEMO_MAX_ENTRIES = 10_000
 
 # Load FLAN-T5 model and tokenizer
 @st.cache_resource
 def load_model():
-    model_name = "google/flan-t5-base"
+    model_name = MODEL_NAME
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
     return tokenizer, model
 
 tokenizer, model = load_model()
 
-# Function to extract text from PDF
+# Passages of each PDF most relevant to a question, instead of its first 2000 characters
+@st.cache_resource
+def load_passage_selector():
+    return PassageSelector()
+
+passage_selector = load_passage_selector()
+
+# Function to extract text from PDF (pages are extracted in parallel)
 def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
+    return pdf_text(pdf_file)
+
+# Methods section of a PDF, cached by content hash so re-running QA does not re-extract
+# unchanged files; falls back to the whole text when no Methods heading is found
+@st.cache_data(show_spinner=False)
+def cached_pdf_text(file_hash, _data):
+    text = extract_text_from_pdf(_data)
+    return find_methods_region(text) or text
+
+# Answers memoized per (document hash, question) for the whole server process, least
+# recently used first; shared by every session, so guarded by a lock
+@st.cache_resource
+def answer_memo():
+    return OrderedDict(), threading.Lock()
 
 # Function to generate answer from model
 def generate_answer(context, question):
-    prompt = f"Context: {context}\n\nQuestion: {question}\n\nAnswer:"
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=1024)
-    outputs = model.generate(**inputs, max_new_tokens=100)
-    return tokenizer.decode(outputs[0], skip_special_tokens=True)
+    return generate_answers([context], [question])[0]
+
+def generate_answers(contexts, questions):
+    """
+    Answers several (context, question) pairs with one batched Flan-T5 generate call; pairs
+    answered before (also in earlier sessions) come from the persistent result cache.
+    """
+    prompts = [f"Context: {context}\n\nQuestion: {question}\n\nAnswer:" for context, question in zip(contexts, questions)]
+    return cached_results(MODEL_NAME, GENERATION_PARAMS, None, prompts, generate_uncached)
+
+def generate_uncached(prompts):
+    inputs = tokenizer(prompts, return_tensors="pt", truncation=True, max_length=GENERATION_PARAMS["max_length"], padding=True)
+    with torch.no_grad():
+        outputs = model.generate(**inputs, max_new_tokens=GENERATION_PARAMS["max_new_tokens"])
+    return [tokenizer.decode(output, skip_special_tokens=True) for output in outputs]
+
+def answer_questions(doc_hash, text, questions):
+    """
+    Answers all questions about one document: memoized answers are reused and the remaining
+    questions run as a single batch (one encoder pass and one generate call).
+    """
+    memo, lock = answer_memo()
+    with lock:
+        answers = {question: memo[(doc_hash, question)] for question in questions if (doc_hash, question) in memo}
+        for question in answers:
+            memo.move_to_end((doc_hash, question))
+    missing = [question for question in dict.fromkeys(questions) if question not in answers]
+    if missing:
+        contexts = passage_selector.select(text, missing, top_k=4)
+        answers.update(zip(missing, generate_answers([contexts[question] for question in missing], missing)))
+        with lock:
+            memo.update({(doc_hash, question): answers[question] for question in missing})
+            while len(memo) > ANSWER_MEMO_MAX_ENTRIES:
+                memo.popitem(last=False)
+    return {question: answers[question] for question in questions}
 
 # Streamlit App
 st.title("🧠 NeuroSift: Extract Methods from Scientific PDFs")
@@ -64,19 +119,12 @@ if st.button("Run QA"):
         results = []
         for file in uploaded_files:
             try:
-                with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                    tmp_file.write(file.read())
-                    tmp_path = tmp_file.name
-
-                with open(tmp_path, 'rb') as f:
-                    text = extract_text_from_pdf(f)
+                data = file.getvalue()
+                doc_hash = hashlib.sha256(data).hexdigest()
+                text = cached_pdf_text(doc_hash, data)
 
-                truncated_text = text[:2000]
                 row = {"PDF": file.name}
-                for question in question_inputs:
-                    answer = generate_answer(truncated_text, question)
-                    row[question] = answer
-
+                row.update(answer_questions(doc_hash, text, question_inputs))
                 results.append(row)
             except Exception as e:
                 st.error(f"❌ Error processing {file.name}: {e}")
@@ -0,0 +1,53 @@
+import time
+import asyncio
+import pytest
+import eegreviewagent
+from eegreviewagent import EEGReviewAgent
+
+
+class StubArticle:
+    metadata = {"PMCID": "stub"}
+    is_research_article = True
+
+
+class StubParser:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def parse_methods(self, metadata, methods_text):
+        time.sleep(0.001)
+        if methods_text == self.fail_on:
+            raise ValueError("context_tokens leaves no room for the methods text")
+        return {"methods": methods_text}
+
+
+@pytest.fixture
+def stub_pipeline(monkeypatch):
+    pmc_ids = [str(1000 + i) for i in range(60)]
+    monkeypatch.setattr(eegreviewagent, "iter_pmc_ids", lambda keywords, max_results=None: iter([pmc_ids]))
+    monkeypatch.setattr(eegreviewagent, "fetch_full_texts",
+                        lambda batch, batch_size: ({pmc_id: f"<xml>{pmc_id}</xml>" for pmc_id in batch}, [], []))
+    monkeypatch.setattr(eegreviewagent, "parse_article", lambda xml, pmc_id: StubArticle())
+    monkeypatch.setattr(eegreviewagent, "extract_methods_section", lambda article: "methods")
+    return pmc_ids
+
+
+def make_agent(parser):
+    agent = EEGReviewAgent.__new__(EEGReviewAgent)
+    agent.parser, agent.manifest = parser, None
+    return agent
+
+
+def run(agent, **options):
+    return asyncio.run(asyncio.wait_for(agent.run_async(["EEG"], queue_size=2, **options), timeout=10))
+
+
+def test_run_async_processes_every_article(stub_pipeline):
+    results = run(make_agent(StubParser()), llm_concurrency=3)
+    assert list(results) == stub_pipeline
+
+
+def test_run_async_raises_when_a_stage_fails(stub_pipeline):
+    # Without supervision the upstream stages block on the full queues and the run never ends
+    with pytest.raises(ValueError, match="no room"):
+        run(make_agent(StubParser(fail_on="methods")), llm_concurrency=1)
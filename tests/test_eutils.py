@@ -0,0 +1,120 @@
+import threading
+from urllib.parse import parse_qs, urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from utils import eutils
+from utils.ratelimit import TokenBucket
+
+
+def article_xml(pmc_id):
+    return (f'<article article-type="research-article"><front><article-meta>'
+            f'<article-id pub-id-type="pmc">PMC{pmc_id}</article-id>'
+            f'<title-group><article-title>Article {pmc_id}</article-title></title-group>'
+            f'</article-meta></front><body/></article>')
+
+
+class StubEutils(BaseHTTPRequestHandler):
+    """efetch stand-in: answers a POSTed ID list with a <pmc-articleset> of the known articles."""
+    requests = []
+    unknown = set()     # IDs PMC has no article for
+    broken = set()      # IDs whose whole batch gets an HTTP error
+    hits = []           # esearch result list of the history search
+    broken_starts = set()   # retstart values of history efetch batches that get an HTTP error
+
+    def send_xml(self, text):
+        data = f'<?xml version="1.0"?>{text}'.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        start, stop = int(query["retstart"]), int(query["retstart"]) + int(query["retmax"])
+        if url.path == "/esearch.fcgi":
+            ids = "".join(f"<Id>{pmc_id}</Id>" for pmc_id in self.hits[start:stop])
+            self.send_xml(f"<eSearchResult><Count>{len(self.hits)}</Count><WebEnv>env</WebEnv>"
+                          f"<QueryKey>1</QueryKey><IdList>{ids}</IdList></eSearchResult>")
+        elif start in self.broken_starts:
+            self.send_error(400)
+        else:
+            self.send_xml(f"<pmc-articleset>{''.join(map(article_xml, self.hits[start:stop]))}</pmc-articleset>")
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        ids = form["id"][0].split(",")
+        type(self).requests.append((self.path, ids))
+        if self.broken.intersection(ids):
+            self.send_error(400)
+            return
+        body = "".join(article_xml(pmc_id) for pmc_id in ids if pmc_id not in self.unknown)
+        self.send_xml(f"<pmc-articleset>{body}</pmc-articleset>")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    StubEutils.requests, StubEutils.unknown, StubEutils.broken = [], set(), set()
+    StubEutils.hits, StubEutils.broken_starts = [], set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubEutils)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(eutils, "EUTILS_BASE", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(eutils, "cache", None)
+    monkeypatch.setattr(eutils, "rate_limiter", TokenBucket(1000))
+    yield StubEutils
+    server.shutdown()
+    server.server_close()
+
+
+def test_ids_are_sent_in_batches(stub):
+    pmc_ids = [f"PMC{100 + i}" for i in range(2 * eutils.EFETCH_BATCH_SIZE + 3)]
+    articles, missing, failed = eutils.efetch_pmc_batch(pmc_ids)
+
+    assert [path for path, _ in stub.requests] == ["/efetch.fcgi"] * 3
+    assert [len(ids) for _, ids in stub.requests] == [eutils.EFETCH_BATCH_SIZE, eutils.EFETCH_BATCH_SIZE, 3]
+    assert sum((ids for _, ids in stub.requests), []) == [eutils.normalize_pmc_id(pmc_id) for pmc_id in pmc_ids]
+    assert list(articles) == [eutils.normalize_pmc_id(pmc_id) for pmc_id in pmc_ids]
+    assert missing == [] and failed == []
+
+
+def test_articleset_is_split_per_id(stub):
+    articles, _, _ = eutils.efetch_pmc_batch(["1", "2", "3"])
+
+    assert set(articles) == {"1", "2", "3"}
+    for pmc_id, xml in articles.items():
+        assert xml.startswith("<article")
+        assert f"PMC{pmc_id}" in xml
+        assert xml.count("<article ") == 1
+
+
+def test_missing_ids_are_reported(stub):
+    stub.unknown = {"2", "5"}
+    articles, missing, failed = eutils.efetch_pmc_batch(["1", "2", "3", "4", "5"], batch_size=2)
+
+    assert set(articles) == {"1", "3", "4"}
+    assert missing == ["2", "5"]
+    assert failed == []
+
+
+def test_failed_batches_are_reported_apart_from_missing_ids(stub):
+    stub.unknown, stub.broken = {"4"}, {"1"}
+    articles, missing, failed = eutils.efetch_pmc_batch(["1", "2", "3", "4"], batch_size=2)
+
+    assert set(articles) == {"3"}
+    assert missing == ["4"]
+    assert failed == ["1", "2"]
+
+
+def test_history_search_collects_ids_of_failed_batches(stub):
+    stub.hits, stub.broken_starts = [str(200 + i) for i in range(6)], {2}
+    search = eutils.HistorySearch("EEG")
+    fetched = [pmc_id for pmc_id, _ in search.articles(batch_size=2)]
+
+    assert fetched == ["200", "201", "204", "205"]
+    assert search.failed == ["202", "203"]
+    assert search.failed_ranges == []
@@ -0,0 +1,70 @@
+import pytest
+from parser import JSON_TEMPLATE, merge_records, split_into_chunks, estimate_tokens
+
+count_words = lambda text: len(text.split())
+
+
+def test_union_keeps_first_occurrence_order_and_spelling():
+    records = [{"preprocessing": {"ICA": "A"}}, {"preprocessing": {"ICA": "B"}}, {"preprocessing": {"ICA": "a"}}]
+    assert merge_records(records)["preprocessing"]["ICA"] == "A; B"
+
+
+def test_majority_prefers_most_frequent_then_earliest():
+    channels = lambda *values: [{"study": {"EEG channels": value}} for value in values]
+    assert merge_records(channels("32", "64", "64"))["study"]["EEG channels"] == "64"
+    assert merge_records(channels("X", "Y", "Y", "X"))["study"]["EEG channels"] == "X"
+
+
+def test_nested_sections_follow_the_schema():
+    records = [{"study": {"task": "oddball", "unknown": "dropped"}, "processing": {"PSD": ["alpha", "beta"]}},
+               {"study": "not a section"}, "not a record"]
+    merged = merge_records(records)
+
+    assert merged.keys() == JSON_TEMPLATE.keys()
+    assert merged["study"].keys() == JSON_TEMPLATE["study"].keys()
+    assert merged["study"]["task"] == "oddball"
+    assert merged["processing"]["PSD"] == "alpha; beta"
+    assert merged["preprocessing"]["ICA"] == ""
+
+
+def test_metadata_overrides_model_values():
+    records = [{"PMCID": "wrong", "title": "Model title", "year": "1999"}]
+    merged = merge_records(records, {"PMCID": "PMC1", "title": "Real title", "year": ""})
+
+    assert merged["PMCID"] == "PMC1"
+    assert merged["title"] == "Real title"
+    assert merged["year"] == "1999"   # empty metadata does not override
+
+
+def test_chunks_respect_the_budget():
+    text = " ".join(f"Sentence number {index} has six words." for index in range(50))
+    chunks = split_into_chunks(text, budget=30, overlap=0, count_tokens=count_words)
+
+    assert len(chunks) > 1
+    assert all(count_words(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_chunks_carry_the_overlap():
+    sentences = [f"Sentence {index} is here." for index in range(20)]
+    chunks = split_into_chunks(" ".join(sentences), budget=20, overlap=5, count_tokens=count_words)
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.split(". ")[-1]
+        assert current.startswith(last_sentence)
+    assert chunks[-1].endswith(sentences[-1])
+
+
+def test_oversize_sentence_is_split_into_word_runs():
+    long_sentence = " ".join(f"w{index}" for index in range(100)) + "."
+    chunks = split_into_chunks(f"Short one. {long_sentence} Short two.", budget=25, overlap=0,
+                               count_tokens=count_words)
+
+    assert all(count_words(chunk) <= 25 for chunk in chunks)
+    assert " ".join(chunks).split() == f"Short one. {long_sentence} Short two.".split()
+
+
+def test_token_estimate():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcde") == 2
@@ -0,0 +1,79 @@
+import random
+import string
+import pytest
+from thefuzz import fuzz
+import pubmed
+from utils import methodstext
+from utils.sectiontitles import MethodsTitleClassifier
+
+# Title variants seen in PMC articles; each is also mutated below to exercise the fuzzy fallback
+TITLES = [
+    "Methods", "METHODS", "Method", "Materials and Methods", "Materials and methods", "Material and Methods",
+    "Materials & Methods", "Methods and Materials", "Methodology", "Methodologies", "Experimental Procedure",
+    "Experimental Procedures", "Experimental procedure", "Experimental Design", "Methods:", "2. Methods",
+    "2 Materials and methods", "Subjects and Methods", "Participants", "EEG recording", "Data analysis",
+    "Statistical analysis", "Results", "Discussion", "Introduction", "Conclusions", "Abstract",
+    "Supplementary Methods", "Study design and methods", "Patients and methods", "  methods  ", "Method s",
+    "Metods", "Mehtods", "Procedure", "Experimental setup", "", "References", "Acknowledgements",
+]
+
+
+def edits(title, rng, count):
+    """Returns random single-character edits (insert, delete, substitute, swap) of a title."""
+    variants = []
+    for _ in range(count):
+        chars = list(title)
+        position = rng.randrange(len(chars) + 1)
+        operation = rng.choice("idsx") if chars else "i"
+        if operation == "i":
+            chars.insert(position, rng.choice(string.ascii_letters + " "))
+        elif operation == "d" and position < len(chars):
+            del chars[position]
+        elif operation == "s" and position < len(chars):
+            chars[position] = rng.choice(string.ascii_letters)
+        elif operation == "x" and position < len(chars) - 1:
+            chars[position], chars[position + 1] = chars[position + 1], chars[position]
+        variants.append("".join(chars))
+    return variants
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(20240501)
+    titles = list(TITLES)
+    for title in TITLES:
+        titles.extend(edits(title, rng, 40))
+    return titles
+
+
+def old_pubmed_decision(title):
+    # pubmed.extract_methods_section before the shared classifier
+    if not title:
+        return False
+    return max(fuzz.ratio(title.strip().lower(), ref) for ref in pubmed.METHODS_TITLES) >= pubmed.SIMILARITY_THRESHOLD
+
+
+def old_methodstext_decision(title):
+    # methodstext.is_methods_section before the shared classifier
+    return any(fuzz.ratio(title.lower().strip(), ref) >= methodstext.SIMILARITY_THRESHOLD
+               for ref in methodstext.METHODS_TITLES)
+
+
+@pytest.mark.parametrize("titles, threshold, old_decision", [
+    (pubmed.METHODS_TITLES, pubmed.SIMILARITY_THRESHOLD, old_pubmed_decision),
+    (methodstext.METHODS_TITLES, methodstext.SIMILARITY_THRESHOLD, old_methodstext_decision),
+], ids=["pubmed", "methodstext"])
+def test_decisions_match_old_rules(corpus, titles, threshold, old_decision):
+    expected = [old_decision(title) for title in corpus]
+
+    # Cold single lookups, batched lookups, and warm lookups answered from the memo
+    assert [MethodsTitleClassifier(titles, threshold).is_methods_title(title) for title in corpus] == expected
+    classifier = MethodsTitleClassifier(titles, threshold)
+    assert classifier.classify_many(corpus) == expected
+    assert [classifier.is_methods_title(title) for title in corpus] == expected
+
+
+def test_module_classifiers_match_old_rules(corpus):
+    assert [pubmed.is_methods_title(title) for title in corpus] == [old_pubmed_decision(title) for title in corpus]
+    assert [methodstext.is_methods_section(title) for title in corpus] == \
+        [old_methodstext_decision(title) for title in corpus]
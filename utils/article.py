@@ -0,0 +1,222 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from functools import cached_property
+from utils.eutils import article_pmc_id
+
+
+def section_text(section):
+    """
+    Extracts and compiles the text content of an XML section, one stripped line per text node.
+
+    Args:
+        section (ElementTree.Element): The XML <sec> element.
+
+    Returns:
+        str: Extracted text content.
+    """
+    lines = []
+    for elem in section.iter():
+        if elem.tag not in ("title", "sec"):
+            if elem.text and elem.text.strip():
+                lines.append(elem.text.strip())
+            if elem.tail and elem.tail.strip():
+                lines.append(elem.tail.strip())
+    return "\n".join(lines).strip()
+
+
+class ParsedArticle:
+    """
+    A JATS article parsed once. Metadata, article type, the section list and
+    methods text are computed lazily from the same tree and memoized.
+    """
+
+    def __init__(self, root, pmc_id=None):
+        """
+        Args:
+            root (ElementTree.Element): An <article> element, or a document containing one
+                (e.g. a <pmc-articleset> with a single article).
+            pmc_id (str): PMC ID of the article; read from the XML when omitted.
+        """
+        self.root = root
+        self.article = root if root.tag == "article" else root.find(".//article")
+        if self.article is None:
+            self.article = root
+        self._pmc_id = pmc_id
+        self._methods = {}
+
+    @classmethod
+    def from_xml(cls, xml_content, pmc_id=None):
+        """
+        Parses an article from an XML string.
+
+        Raises:
+            xml.etree.ElementTree.ParseError: If the XML is malformed.
+        """
+        return cls(ET.fromstring(xml_content), pmc_id)
+
+    @classmethod
+    def from_file(cls, file_path, pmc_id=None):
+        """
+        Parses an article from an XML file; the PMC ID defaults to the file name stem.
+
+        Raises:
+            xml.etree.ElementTree.ParseError: If the XML is malformed.
+        """
+        file_path = Path(file_path)
+        return cls(ET.parse(file_path).getroot(), pmc_id or file_path.stem)
+
+    @property
+    def pmc_id(self):
+        return self._pmc_id or article_pmc_id(self.article) or ""
+
+    @cached_property
+    def metadata(self):
+        """dict: PMCID, PMID, title, authors and publication year."""
+        article = self.article
+        pmid = article.findtext('.//article-id[@pub-id-type="pmid"]', default="")
+        title = article.findtext('.//article-title', default="")
+        authors = [" ".join(filter(None, [a.findtext('given-names', ''), a.findtext('surname', '')]))
+                   for a in article.findall('.//contrib[@contrib-type="author"]')]
+        year = article.findtext('.//pub-date/year', '')
+        return {"PMCID": self.pmc_id, "PMID": pmid, "title": title, "authors": authors, "year": year}
+
+    @cached_property
+    def article_type(self):
+        """str: The article-type attribute of <article> (e.g. "research-article"), or None."""
+        return self.article.get("article-type")
+
+    @property
+    def is_research_article(self):
+        return self.article_type == "research-article"
+
+    @cached_property
+    def sections(self):
+        """list: (title text or None, <sec> element) for every section, in document order."""
+        sections = []
+        for sec in self.article.iter("sec"):
+            title_elem = sec.find("title")
+            sections.append((title_elem.text if title_elem is not None else None, sec))
+        return sections
+
+    def find_sections(self, predicate):
+        """
+        Returns the <sec> elements for which predicate(title, sec) is true.
+
+        Args:
+            predicate (Callable[[str, Element], bool]): Receives the title text (or None) and the section.
+        """
+        return [sec for title, sec in self.sections if predicate(title, sec)]
+
+    def methods_text(self, predicate, text_from_section=section_text, separator="\n\n"):
+        """
+        Returns the joined text of the methods sections selected by predicate, memoized per predicate.
+
+        Args:
+            predicate (Callable[[str, Element], bool]): Selects the methods sections (see `find_sections`).
+            text_from_section (Callable[[Element], str]): Extracts the text of one section.
+            separator (str): Joins the texts of several sections.
+
+        Returns:
+            str: The methods text, or None if no (non-empty) methods section was found.
+        """
+        key = (predicate, text_from_section, separator)
+        if key not in self._methods:
+            texts = [text for sec in self.find_sections(predicate) if (text := text_from_section(sec))]
+            self._methods[key] = separator.join(texts) if texts else None
+        return self._methods[key]
+
+
+def sniff_article_type(source):
+    """
+    Reads the article-type attribute of the first <article> in a JATS file without parsing the
+    rest: iterparse stops at the element's start tag, so only the first few KB are read.
+
+    Args:
+        source (str | Path | file object): XML file to read.
+
+    Returns:
+        str: The article-type attribute, or None if it is missing. A file without an
+            <article> element falls back to its root element's attribute, like ParsedArticle.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: If the XML is malformed before the first <article>.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return sniff_article_type(f)
+
+    root = None
+    for _, elem in ET.iterparse(source, events=("start",)):
+        if elem.tag == "article":
+            return elem.get("article-type")
+        if root is None:
+            root = elem
+    return root.get("article-type") if root is not None else None
+
+
+def iter_articles(source, predicate):
+    """
+    Streams the <article> elements of a JATS file with iterparse, keeping only what
+    the pipeline needs: the <front> metadata and the sections selected by predicate.
+
+    Everything else is cleared as soon as it has been parsed, so peak memory is bounded
+    by the largest kept front/methods subtree rather than by the input size. Works for
+    single articles and for multi-article files such as saved efetch <pmc-articleset>s.
+
+    Args:
+        source (str | Path | file object): XML file to read (binary file objects are fine).
+        predicate (Callable[[str, Element], bool]): Section selector, called with (None, sec)
+            when a <sec> opens and with (title text, sec) once its first <title> is parsed.
+
+    Yields:
+        ParsedArticle: A pruned article holding <front> and the kept sections, in document order.
+    """
+    stack = []          # [element, kept, title_seen] for every open element
+    in_article = False
+    front = None
+    kept_secs = []
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            parent_kept = stack[-1][1] if stack else False
+            if elem.tag == "article" and not in_article:
+                in_article, front, kept_secs = True, None, []
+            kept = parent_kept or (in_article and (
+                elem.tag == "front" or (elem.tag == "sec" and predicate(None, elem))))
+            stack.append([elem, kept, False])
+            continue
+
+        _, kept, _ = stack.pop()
+        parent_entry = stack[-1] if stack else None
+        parent = parent_entry[0] if parent_entry else None
+
+        if elem.tag == "title" and parent is not None and parent.tag == "sec" and not parent_entry[2]:
+            parent_entry[2] = True
+            if not parent_entry[1] and predicate(elem.text, parent):
+                parent_entry[1] = kept = True
+
+        if kept:
+            if elem.tag == "front" and front is None:
+                front = elem
+            elif elem.tag == "sec" and not parent_entry[1]:
+                # Top-level kept section: move it out of the ancestors that are about to be cleared
+                parent.remove(elem)
+                kept_secs.append(elem)
+            continue
+
+        if elem.tag == "article" and in_article:
+            pruned = ET.Element("article", dict(elem.attrib))
+            if front is not None:
+                pruned.append(front)
+            ET.SubElement(pruned, "body").extend(kept_secs)
+            in_article = False
+            if parent is not None:
+                parent.remove(elem)
+            elem.clear()
+            yield ParsedArticle(pruned)
+            continue
+
+        # Children parsed before a section's title (e.g. <label>) stay until the section is classified
+        if parent is not None and not (parent.tag == "sec" and not parent_entry[2]):
+            parent.remove(elem)
+            elem.clear()
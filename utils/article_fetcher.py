@@ -1,7 +1,14 @@
+import io
 import os
+import shutil
+from functools import partial
 import requests
 import xml.etree.ElementTree as ET
-import re
+from utils.mesh import mesh_expander
+from utils.article import ParsedArticle, iter_articles, sniff_article_type
+from utils.batch import FileResult, run_batch, summarize
+from utils.corpus import CorpusStore
+from utils.eutils import eutils_request, efetch_pmc_batch, normalize_pmc_id, HistorySearch, EFETCH_BATCH_SIZE, ESEARCH_PAGE_SIZE
 
 # --- MeSH and Query Optimization Functions ---
 def get_mesh_terms(keyword):
@@ -18,37 +25,13 @@ def get_mesh_terms(keyword):
     Raises:
         Exception: If there is an error during the HTTP request or XML parsing, an exception is caught 
         and an error message is printed.
+    Lookups are memoized in memory and on disk by the shared utils.mesh.MeshExpander.
     """
-    """Retrieve relevant MeSH terms for a keyword"""
-    try:
-        search_url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=mesh&term={keyword}&retmode=xml"
-        search_response = requests.get(search_url, timeout=10)
-        search_root = ET.fromstring(search_response.content)
-        
-        query_translation = search_root.find('.//QueryTranslation')
-        if query_translation is None:
-            return []
-
-        translated_query = query_translation.text
-        terms = re.findall(r'"([^"]+)"\[MeSH Terms\]', translated_query)
-        
-        return terms[:5]
-    
-    except Exception as e:
-        print(f"MeSH retrieval error: {e}")
-        return []
+    return mesh_expander.terms(keyword)
 
 def build_enhanced_query(keywords):
-    """Build optimized query using MeSH terms and LLM"""
-    # Build base query with MeSH terms
-    query_parts = []
-    for keyword in keywords:
-        terms = [f'"{keyword}"[Title/Abstract]'] + [f'"{term}"[MeSH Terms]' for term in get_mesh_terms(keyword)]
-        query_parts.append(f'({" OR ".join(terms)})')
-    
-    base_query = " AND ".join(query_parts)
-    
-    return base_query
+    """Build optimized query using MeSH terms; the MeSH lookups run concurrently and the query is memoized"""
+    return mesh_expander.build_query(keywords)
 
 # --- Modified Search Function ---
 def search_pmc_by_keyword(keywords):
@@ -67,14 +50,10 @@ def search_pmc_by_keyword(keywords):
     try:
         # Build enhanced query
         query = build_enhanced_query(keywords)
-        encoded_query = requests.utils.quote(query)
-        url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pmc&term={encoded_query}&retmode=xml&retmax=10000"
-
-        response = requests.get(url)
-        response.raise_for_status()
+        content = eutils_request("esearch", {"db": "pmc", "term": query, "retmode": "xml", "retmax": 10000}, kind="search")
 
         # Parse XML properly
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(content)
         pmc_ids = [id_tag.text for id_tag in root.findall('.//IdList/Id')]
         
         print(f"Total articles found: {len(pmc_ids)}")
@@ -89,6 +68,55 @@ def search_pmc_by_keyword(keywords):
     
     return []
 
+def search_pmc_history(keywords):
+    """
+    Runs the MeSH-optimized PMC search on the NCBI history server.
+
+    Args:
+        keywords (List[str]): The keywords to search for in PMC.
+
+    Returns:
+        HistorySearch: The search; stream its IDs with `id_pages()` or its full texts with `articles()`.
+    """
+    return HistorySearch(build_enhanced_query(keywords))
+
+def iter_pmc_ids(keywords, page_size=ESEARCH_PAGE_SIZE, max_results=None):
+    """
+    Streams the PMC IDs matching the keywords page by page, without a cap on the number of hits.
+
+    Args:
+        keywords (List[str]): The keywords to search for in PMC.
+        page_size (int): IDs per esearch request.
+        max_results (int): Stop after this many IDs; None streams every hit.
+
+    Yields:
+        List[str]: The next page of PMC IDs.
+    """
+    yield from search_pmc_history(keywords).id_pages(page_size=page_size, max_results=max_results)
+
+def iter_full_texts_pmc(keywords, batch_size=EFETCH_BATCH_SIZE, max_results=None):
+    """
+    Streams the full texts of all PMC articles matching the keywords, fetched from the search's WebEnv.
+
+    Args:
+        keywords (List[str]): The keywords to search for in PMC.
+        batch_size (int): Articles per efetch request.
+        max_results (int): Stop after this many articles; None fetches every hit.
+
+    Yields:
+        tuple: (PMC ID, article XML string). Articles of failed efetch batches are fetched
+            again by ID at the end; IDs that still fail are printed.
+    """
+    search = search_pmc_history(keywords)
+    yield from search.articles(batch_size=batch_size, max_results=max_results)
+    if search.failed:
+        articles, _, failed = efetch_pmc_batch(search.failed, batch_size=batch_size)
+        yield from articles.items()
+        if failed:
+            print(f"[iter_full_texts_pmc] Fetch failed for: {failed}")
+    if search.failed_ranges:
+        print(f"[iter_full_texts_pmc] Unlisted failed result ranges (retstart, retmax): {search.failed_ranges}")
+
 # --- Existing Full-Text Function (unchanged) ---
 def fetch_full_text_pmc(pmc_id):
     """
@@ -99,33 +127,65 @@ def fetch_full_text_pmc(pmc_id):
 
     Returns:
         str: The full text of the article in XML format if the request is successful.
-        None: If the request fails (i.e., the status code is not 200).
+        None: If the request fails or PMC returns no article for the ID.
+    """
+    articles, _, _ = efetch_pmc_batch([pmc_id])
+    return articles.get(normalize_pmc_id(pmc_id))
+
+def fetch_full_texts_pmc(pmc_ids, batch_size=EFETCH_BATCH_SIZE):
+    """
+    Fetches the full texts of many PMC articles, sending batch_size IDs per efetch request.
+
+    Args:
+        pmc_ids (List[str]): The PubMed Central IDs of the articles to fetch.
+        batch_size (int): Number of IDs sent per efetch request.
+
+    Returns:
+        tuple: (dict of PMC ID -> article XML, list of PMC IDs with no full text returned,
+            list of PMC IDs whose request failed and can be retried).
+    """
+    return efetch_pmc_batch(pmc_ids, batch_size=batch_size)
+
+def fetch_to_corpus(pmc_ids, store, batch_size=EFETCH_BATCH_SIZE):
+    """
+    Fetches full texts straight into a CorpusStore, skipping articles it already holds.
+
+    Args:
+        pmc_ids (List[str]): The PubMed Central IDs of the articles to fetch.
+        store (CorpusStore): Corpus to append to.
+        batch_size (int): Number of IDs sent per efetch request.
+
+    Returns:
+        tuple: (number of full texts added, list of PMC IDs with no full text returned,
+            list of PMC IDs whose request failed and can be retried).
     """
-    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pmc&id={pmc_id}&retmode=xml"
-    response = requests.get(url)
-    return response.text if response.status_code == 200 else None
+    pmc_ids = [normalize_pmc_id(pmc_id) for pmc_id in pmc_ids]
+    missing_ids = [pmc_id for pmc_id in dict.fromkeys(pmc_ids) if pmc_id not in store]
+    added, not_returned, failed = 0, [], []
+    for start in range(0, len(missing_ids), batch_size):
+        articles, missing, batch_failed = efetch_pmc_batch(missing_ids[start:start + batch_size], batch_size=batch_size)
+        added += store.put_fulltexts(articles.items())
+        not_returned.extend(missing)
+        failed.extend(batch_failed)
+    print(f"Added {added} full texts to the corpus ({len(pmc_ids) - len(missing_ids)} already stored)")
+    return added, not_returned, failed
 
 def is_research_article(file_path):
     """
     Check if an XML file is a research article based on its content.
+
+    Only the XML up to the first <article> start tag is parsed (see utils.article.sniff_article_type).
     
     Args:
-        file_path (Path): Path to the XML file.
+        file_path (Path | ParsedArticle): Path to the XML file, or an already parsed article.
     
     Returns:
         bool: True if the file is a research article, False otherwise.
     """
     try:
-        # Parse the XML file
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-
-        # Find the article element and check its type
-        article_element = root.find('.//article')
-        if article_element is not None:
-            article_type = article_element.attrib.get('article-type')
-            if article_type == 'research-article':
-                return True
+        if isinstance(file_path, ParsedArticle):
+            return file_path.is_research_article
+        return sniff_article_type(file_path) == "research-article"
 
     except ET.ParseError as e:
         # Handle XML parsing errors
@@ -136,25 +196,207 @@ def is_research_article(file_path):
     
     return False
 
-def filter_research_articles(source_folder, destination_folder):
+def copy_file(source, destination, link=False):
+    """
+    Copies a file without reading it into Python: shutil.copyfile uses the kernel's
+    copy (sendfile on Linux, fcopyfile on macOS). With link=True the destination is
+    hard-linked to the source instead, falling back to a copy across file systems.
+
+    Args:
+        source (Path): File to copy.
+        destination (Path): Target path; an existing file is replaced.
+        link (bool): Hard-link instead of copying. Both names then share the same data,
+            so editing one in place changes the other.
+    """
+    if link:
+        try:
+            destination.unlink(missing_ok=True)
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, destination)
+
+def filter_research_article_file(xml_file, destination_folder, link=False):
+    """
+    Copies one XML file to the destination folder if it is a research article.
+
+    Args:
+        xml_file (Path): The XML file to check.
+        destination_folder (Path): Folder to save research articles.
+        link (bool): Hard-link the file instead of copying it (see `copy_file`).
+
+    Returns:
+        FileResult: "saved", "skipped" or "error", with the message to report.
+    """
+    try:
+        if sniff_article_type(xml_file) != "research-article":
+            return FileResult(xml_file.name, "skipped")
+        # Copy the file to the research articles folder
+        copy_file(xml_file, destination_folder / xml_file.name, link=link)
+        return FileResult(xml_file.name, "saved", f"Saved research article: {xml_file.name}")
+    except ET.ParseError as e:
+        return FileResult(xml_file.name, "error", f"Error parsing file {xml_file}: {e}")
+    except Exception as e:
+        return FileResult(xml_file.name, "error", f"Unexpected error with file {xml_file}: {e}")
+
+def filter_research_articles(source_folder, destination_folder, workers=1, chunksize=None, link=False):
     """
     Filter XML files to identify and save research articles to a separate folder.
+
+    Each file is read only up to its first <article> start tag and research articles are
+    copied by the kernel (or hard-linked), so filtering a large folder is I/O-bound.
     
     Args:
         source_folder (Path): Folder containing XML files.
-        destination_folder (Path): Folder to save research articles.
+        destination_folder (Path): Folder to save research articles (created if missing).
+        workers (int): Worker processes to spread the files over; None uses every core.
+        chunksize (int): Files per work unit sent to a worker (see utils.batch.run_batch).
+        link (bool): Hard-link research articles into the destination instead of copying them.
+
+    Returns:
+        dict: Number of files per status ("saved", "skipped", "error"); per-file messages
+            are printed as the files are processed.
+    """
+    destination_folder.mkdir(parents=True, exist_ok=True)
+    results = run_batch(partial(filter_research_article_file, destination_folder=destination_folder, link=link),
+                        sorted(source_folder.glob("*.xml")), workers=workers, chunksize=chunksize)
+    summary = summarize(results)
+    print(f"Research article filter summary: {summary}")
+    return summary
+
+def filter_research_corpus(store):
+    """
+    Research-article filter for a CorpusStore: article types are sniffed when full texts are
+    added, so this is an indexed query and nothing is copied.
+
+    Args:
+        store (CorpusStore): The corpus.
+
+    Returns:
+        dict: Number of articles per status ("saved" for research articles, as in
+            `filter_research_articles`); iterate them with store.iter_fulltexts("research-article").
+    """
+    summary = {}
+    for article_type, count in store.article_type_counts().items():
+        status = {"research-article": "saved", "parse_error": "error"}.get(article_type, "skipped")
+        summary[status] = summary.get(status, 0) + count
+    print(f"Research article filter summary: {summary}")
+    return summary
+
+
+def has_methods_sec_type(title, sec):
+    """Section predicate: the <sec> is tagged sec-type="methods"."""
+    return sec.get("sec-type") == "methods"
+
+def has_methods_title(title, sec):
+    """Section predicate: the full text of the section title is exactly "Methods"."""
+    title_elem = sec.find("title")
+    return title_elem is not None and "".join(title_elem.itertext()) == "Methods"
+
+def is_methods_candidate(title, sec):
+    """Section predicate used when streaming: keeps every section either check above may select."""
+    return has_methods_sec_type(title, sec) or has_methods_title(title, sec)
+
+def methods_section_text(section):
+    """
+    Extracts the text of a methods section, skipping nested titles and bare numbers.
+
+    Args:
+        section (ElementTree.Element): The XML <sec> element.
+
+    Returns:
+        str: One line per text node, with inner newlines replaced by spaces.
+    """
+    methods_text = []
+    for element in section.iter():
+        if element.tag not in ["title", "sec"]:
+            if element.text and element.text.strip() and not element.text.strip().isdigit():
+                methods_text.append(element.text.strip().replace("\n", " "))
+            if element.tail and element.tail.strip() and not element.tail.strip().isdigit():
+                methods_text.append(element.tail.strip().replace("\n", " "))
+    return "\n".join(filter(None, methods_text)).strip()
+
+def article_methods_text(article):
+    """
+    Applies the extraction rules to one article: it needs a sec-type="methods" section, and the
+    text of the sections titled "Methods" is returned.
+
+    Returns:
+        tuple: (methods text, None), or (None, reason the article was skipped).
+    """
+    # Search for all "Methods" sections in the XML (using sec-type="methods")
+    if not article.find_sections(has_methods_sec_type):
+        return None, "No section type of 'methods' found"
+
+    # Find all sections with the title "Methods"
+    content = article.methods_text(has_methods_title, methods_section_text, separator="\n")
+    if content is None:
+        return None, "No 'Methods' section found"
+    return content, None
+
+def extract_methods_file(file_path, output_folder):
+    """
+    Extract the "Methods" sections of one XML file and save them as a text file.
+
+    The file is streamed (only front matter and candidate methods sections are kept in
+    memory); every article after the first one gets its PMC ID appended to the output name.
+
+    Args:
+        file_path (Path): The XML file.
+        output_folder (Path): Folder where the methods text files are saved.
+
+    Returns:
+        List[FileResult]: One result per article, or a single "error" or "no_article" result
+            (the file holds no <article> element).
+    """
+    results = []
+    try:
+        for index, article in enumerate(iter_articles(file_path, is_methods_candidate)):
+            pmc_id = file_path.name.replace(".xml", "")
+            if index > 0:
+                pmc_id = f"{pmc_id}_{article.pmc_id}"
+
+            content, reason = article_methods_text(article)
+            if content is None:
+                results.append(FileResult(file_path.name, "skipped", f"{reason} in {file_path}"))
+                continue
+
+            # Save the methods section to a text file
+            output_file = output_folder / f"methods_{pmc_id}.txt"
+            with open(output_file, "w", encoding="utf-8") as txt_file:
+                txt_file.write(content)
+            results.append(FileResult(file_path.name, "saved", f"Methods section saved to {output_file}"))
+
+    except Exception as e:
+        results.append(FileResult(file_path.name, "error", f"Error processing file {file_path}: {e}"))
+    return results or [FileResult(file_path.name, "no_article", f"No <article> element in {file_path}")]
+
+def extract_methods_record(pmc_id, store):
     """
-    # Iterate through all XML files in the source folder
-    for xml_file in source_folder.glob("*.xml"):
-        if is_research_article(xml_file):
-            # Copy the file to the research articles folder
-            destination_path = destination_folder / xml_file.name
-            with open(xml_file, "r", encoding="utf-8") as src, open(destination_path, "w", encoding="utf-8") as dst:
-                dst.write(src.read())
-            print(f"Saved research article: {xml_file.name}")
+    Extracts the "Methods" sections of one corpus article and stores them in the corpus.
+
+    Args:
+        pmc_id (str): PMC ID of the article.
+        store (CorpusStore): Corpus holding the full text; receives the methods text.
 
+    Returns:
+        FileResult: "saved", "skipped" or "error" for the PMC ID.
+    """
+    try:
+        xml = store.get_fulltext(pmc_id)
+        article = next(iter_articles(io.StringIO(xml), is_methods_candidate), None) if xml else None
+        if article is None:
+            return FileResult(pmc_id, "skipped", f"No article found for {pmc_id}")
+        content, reason = article_methods_text(article)
+        if content is None:
+            return FileResult(pmc_id, "skipped", f"{reason} in {pmc_id}")
+        store.put_methods(pmc_id, content)
+        return FileResult(pmc_id, "saved", f"Methods section of {pmc_id} saved to the corpus")
+    except Exception as e:
+        return FileResult(pmc_id, "error", f"Error processing {pmc_id}: {e}")
 
-def extract_methods(input_folder, output_folder):
+def extract_methods(input_folder, output_folder, workers=1, chunksize=None):
     """
     Extract methods-related sections from all XML files in the 'ResearchArticles' folder.
 
@@ -162,65 +404,59 @@ def extract_methods(input_folder, output_folder):
     related to methods (e.g., "Methods," "Materials and Methods," "Methodology"), and saves 
     them as text files in a 'methods' subfolder.
 
+    Args:
+        input_folder (Path): Folder containing the research article XML files.
+        output_folder (Path): Folder where the methods text files are saved.
+        workers (int): Worker processes to spread the files over; None uses every core.
+        chunksize (int): Files per work unit sent to a worker (see utils.batch.run_batch).
+
     Returns:
-        None
+        List[FileResult]: Per-file status, in file name order (None if the input folder is missing).
     """
 
     if not input_folder.exists():
         print(f"Input folder '{input_folder}' does not exist.")
         return
 
-    # Iterate through XML files in the folder
-    for file_path in input_folder.glob("*.xml"):
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-
-            # Search for all "Methods" sections in the XML (using sec-type="methods")
-            methods_sections = root.findall(".//sec[@sec-type='methods']")
-            if not methods_sections:
-                print(f"No section type of 'methods' found in {file_path}")
-                continue
+    results = run_batch(partial(extract_methods_file, output_folder=output_folder),
+                        sorted(input_folder.glob("*.xml")), workers=workers, chunksize=chunksize)
+    print(f"Methods extraction summary: {summarize(results)}")
+    return results
 
-            # Find all sections with the title "Methods"
-            methods_sections = root.findall(".//sec[title='Methods']")
-            if not methods_sections:
-                print(f"No 'Methods' section found in {file_path}")
-                continue
-            
-            # Extract all text content from the methods sections
-            methods_text = []
-            for section in methods_sections:
-                for element in section.iter():
-                    if element.tag not in ["title", "sec"]:
-                        if element.text and element.text.strip() and not element.text.strip().isdigit():
-                            methods_text.append(element.text.strip().replace("\n", " "))
-                        if element.tail and element.tail.strip() and not element.tail.strip().isdigit():
-                            methods_text.append(element.tail.strip().replace("\n", " "))
-
-            # Combine all extracted text into one string
-            content = "\n".join(filter(None, methods_text)).strip()
+def extract_methods_corpus(store, workers=1, chunksize=None):
+    """
+    Corpus version of `extract_methods`: extracts the methods sections of every research
+    article in a CorpusStore and stores them in the same corpus.
 
-            # Save the methods section to a text file
-            pmc_id = file_path.name.replace(".xml", "")
-            output_file = output_folder / f"methods_{pmc_id}.txt"
-            with open(output_file, "w", encoding="utf-8") as txt_file:
-                txt_file.write(content)
-            print(f"Methods section saved to {output_file}")
+    Args:
+        store (CorpusStore): The corpus.
+        workers (int): Worker processes to spread the articles over; None uses every core.
+        chunksize (int): Articles per work unit sent to a worker (see utils.batch.run_batch).
 
-        except Exception as e:
-            print(f"Error processing file {file_path}: {e}")
+    Returns:
+        List[FileResult]: Per-article status, in PMC ID order.
+    """
+    results = run_batch(partial(extract_methods_record, store=store), store.pmc_ids("research-article"),
+                        workers=workers, chunksize=chunksize)
+    print(f"Methods extraction summary: {summarize(results)}")
+    return results
 
 def read_txt_files(directory):
     """
     Reads all .txt files from a specified directory.
 
     Args:
-        directory (str): Path to the directory containing .txt files.
+        directory (str | CorpusStore): Path to the directory containing .txt files, or a corpus
+            whose methods sections are read instead.
 
     Returns:
-        dict: A dictionary with filenames as keys and file content as values.
+        dict: A dictionary with filenames as keys and file content as values. Corpus sections
+            are keyed by the file name extract_methods gives them ("methods_<PMC ID>.txt"),
+            so results look the same whichever source they came from.
     """
+    if isinstance(directory, CorpusStore):
+        return {f"methods_{pmc_id}.txt": text.strip() for pmc_id, text in directory.iter_methods()}
+
     txt_files = {}
     for file in os.listdir(directory):
         if file.endswith('.txt'):
@@ -0,0 +1,303 @@
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils import httpclient
+from utils.models import registry
+
+HF_INFERENCE_URL = "https://api-inference.huggingface.co/models"
+
+# Micro-batching defaults: prompts per forward pass, and how long (seconds) the first prompt
+# of a batch waits for others to arrive
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT = 0.02
+
+# (connect, read) timeout for a local inference server; a CPU batch can take minutes
+LOCAL_SERVER_TIMEOUT = (5, 600)
+
+
+class MicroBatcher:
+    """
+    Collects prompts submitted concurrently from many threads and runs them as one batch.
+
+    A background thread takes the first waiting prompt, gathers up to `max_batch_size`
+    prompts that arrive within `max_wait` seconds, and hands each group of prompts with
+    identical generation parameters to `run_batch` in a single call. Callers block until
+    their own result is ready; an exception in a batch, or a batch that returns the wrong
+    number of texts, is raised in every caller of it.
+    """
+
+    def __init__(self, run_batch, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        """
+        Args:
+            run_batch (Callable[[List[str], dict], List[str]]): Generates the texts of a batch of prompts.
+            max_batch_size (int): Maximum prompts per run_batch call.
+            max_wait (float): Seconds to wait for more prompts after the first one.
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, prompt, parameters):
+        """Queues a prompt and returns its generated text once its batch has run."""
+        future = Future()
+        self._queue.put((prompt, parameters, future))
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Nothing may escape this loop: a dead worker would leave every later caller blocked
+        while True:
+            batch = self._collect()
+            try:
+                groups = {}
+                for prompt, parameters, future in batch:
+                    try:
+                        key = json.dumps(parameters, sort_keys=True)
+                    except (TypeError, ValueError) as e:
+                        future.set_exception(e)
+                        continue
+                    groups.setdefault(key, (parameters, []))[1].append((prompt, future))
+                for parameters, items in groups.values():
+                    self._run_group(parameters, items)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_group(self, parameters, items):
+        try:
+            texts = self.run_batch([prompt for prompt, _ in items], parameters)
+            if len(texts) != len(items):
+                raise ValueError(f"Batch of {len(items)} prompts returned {len(texts)} texts")
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), text in zip(items, texts):
+            future.set_result(text)
+
+
+class RemoteHFBackend:
+    """Hugging Face Inference API (one HTTP request per prompt)."""
+
+    def __init__(self, model_id, hf_api_key):
+        self.model_id = model_id
+        self.cache_id = model_id
+        self.endpoint = f"{HF_INFERENCE_URL}/{model_id}"
+        self.headers = {"Authorization": f"Bearer {hf_api_key}"}
+
+    def generate(self, prompt, parameters):
+        """
+        Generates text for a prompt.
+
+        Returns:
+            str: The generated text, as returned by the API.
+
+        Raises:
+            ValueError: If the API returns an error.
+        """
+        payload = {"inputs": prompt, "parameters": parameters, "options": {"wait_for_model": True}}
+        out = httpclient.post(self.endpoint, headers=self.headers, json=payload).json()
+        if isinstance(out, dict) and "error" in out:
+            raise ValueError(out["error"])
+        return out[0]["generated_text"]
+
+
+class TransformersBackend:
+    """
+    In-process transformers causal LM, loaded on first use through the shared model registry
+    (device and INFERENCE_MODE as in utils.inference). Concurrent prompts are micro-batched
+    into single left-padded generate calls; only the generated continuation is returned.
+    """
+
+    def __init__(self, model_id, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        """
+        Args:
+            model_id (str): Hugging Face checkpoint of a causal LM.
+            max_batch_size (int): Prompts per forward pass.
+            max_wait (float): Seconds the first prompt of a batch waits for others.
+        """
+        from utils.inference import INFERENCE_MODE
+        self.model_id = model_id
+        self.cache_id = f"{model_id}@{INFERENCE_MODE}"
+        self.registry_key = f"causal-lm:{model_id}"
+        self.batcher = MicroBatcher(self.generate_many, max_batch_size, max_wait)
+
+    def load(self):
+        from utils.inference import load_causal_lm
+        tokenizer, model = load_causal_lm(self.model_id)
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return tokenizer, model
+
+    def warm(self):
+        """Starts loading the model in the background."""
+        registry.register(self.registry_key, self.load)
+        return registry.warm(self.registry_key)
+
+    def count_tokens(self, text):
+        """Counts the tokens of a text with the model's tokenizer (loads the model on first use)."""
+        tokenizer, _ = registry.get(self.registry_key, self.load)
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def generate(self, prompt, parameters):
+        """Generates text for a prompt, batched with the prompts other threads submit meanwhile."""
+        return self.batcher.submit(prompt, parameters)
+
+    def generate_many(self, prompts, parameters):
+        """
+        Generates the continuations of several prompts in one generate call.
+
+        Args:
+            prompts (List[str]): Prompts.
+            parameters (dict): "max_new_tokens" and "temperature" (0 decodes greedily).
+
+        Returns:
+            List[str]: Generated text per prompt.
+        """
+        import torch
+        tokenizer, model = registry.get(self.registry_key, self.load)
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+        temperature = parameters.get("temperature", 0)
+        kwargs = {"max_new_tokens": parameters.get("max_new_tokens", 512), "pad_token_id": tokenizer.pad_token_id}
+        kwargs.update({"do_sample": True, "temperature": temperature} if temperature else {"do_sample": False})
+        with torch.no_grad():
+            output = model.generate(**inputs, **kwargs)
+        width = inputs["input_ids"].shape[1]
+        return [tokenizer.decode(row[width:], skip_special_tokens=True) for row in output]
+
+
+class LocalServerBackend:
+    """
+    Client of a local inference server speaking the Hugging Face Inference API format (e.g. the
+    stand-in server below). Concurrent prompts are micro-batched into one request with a list
+    of inputs, which the server answers with one forward pass.
+    """
+
+    def __init__(self, url, model_id, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        """
+        Args:
+            url (str): Server endpoint, e.g. "http://localhost:8080".
+            model_id (str): Model served there (used for the result cache).
+            max_batch_size (int): Prompts per request.
+            max_wait (float): Seconds the first prompt of a batch waits for others.
+        """
+        self.url = url
+        self.model_id = model_id
+        self.cache_id = f"{model_id}@{url}"
+        self.batcher = MicroBatcher(self.generate_many, max_batch_size, max_wait)
+
+    def generate(self, prompt, parameters):
+        """Generates text for a prompt, batched with the prompts other threads submit meanwhile."""
+        return self.batcher.submit(prompt, parameters)
+
+    def generate_many(self, prompts, parameters):
+        """Sends several prompts in one request and returns the generated text per prompt."""
+        response = httpclient.post(self.url, json={"inputs": prompts, "parameters": parameters},
+                                   timeout=LOCAL_SERVER_TIMEOUT)
+        out = response.json()
+        if isinstance(out, dict) and "error" in out:
+            raise ValueError(out["error"])
+        # Accept both [{"generated_text"}] and [[{"generated_text"}]] (one list per input)
+        return [(item[0] if isinstance(item, list) else item)["generated_text"] for item in out]
+
+
+def make_backend(backend, model_id, hf_api_key=None):
+    """
+    Builds an inference backend from a short description.
+
+    Args:
+        backend: "remote" (Hugging Face Inference API), "transformers" (in-process model),
+            the URL of a local inference server, or a backend object (returned as is).
+        model_id (str): Hugging Face model ID.
+        hf_api_key (str): API key for the remote backend.
+
+    Raises:
+        ValueError: If the description is not recognised.
+    """
+    if not isinstance(backend, str):
+        return backend
+    if backend == "remote":
+        return RemoteHFBackend(model_id, hf_api_key)
+    if backend == "transformers":
+        return TransformersBackend(model_id)
+    if backend.startswith(("http://", "https://")):
+        return LocalServerBackend(backend, model_id)
+    raise ValueError(f"Unknown backend '{backend}' (expected 'remote', 'transformers' or a server URL)")
+
+
+# ============================ Stand-in server ============================ #
+def serve(backend, host="127.0.0.1", port=8080):
+    """
+    Serves a backend over HTTP in the Hugging Face Inference API format, so LLMParser can use a
+    local model (air-gapped) through LocalServerBackend or any client of that API.
+
+    POST any path with {"inputs": str | List[str], "parameters": {...}}; the answer is
+    [{"generated_text": ...}] with one item per input. Single-prompt requests from concurrent
+    clients are micro-batched by a TransformersBackend.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                inputs, parameters = body["inputs"], body.get("parameters", {})
+                if isinstance(inputs, list):
+                    texts = backend.generate_many(inputs, parameters)
+                else:
+                    texts = [backend.generate(inputs, parameters)]
+                status, out = 200, [{"generated_text": text} for text in texts]
+            except Exception as e:
+                status, out = 500, {"error": str(e)}
+            data = json.dumps(out).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"[backends] Serving {getattr(backend, 'model_id', backend)} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    cli = argparse.ArgumentParser(description="Local stand-in for the Hugging Face Inference API.")
+    cli.add_argument("--model", default="mistralai/Mistral-7B-Instruct-v0.1")
+    cli.add_argument("--host", default="127.0.0.1")
+    cli.add_argument("--port", type=int, default=8080)
+    cli.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    args = cli.parse_args()
+
+    backend = TransformersBackend(args.model, max_batch_size=args.batch_size)
+    backend.warm()
+    serve(backend, args.host, args.port)
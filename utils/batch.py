@@ -0,0 +1,67 @@
+import os
+import math
+from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+
+@dataclass
+class FileResult:
+    """Outcome of processing one file in a batch."""
+    file: str
+    status: str        # e.g. "saved", "skipped", "error"
+    message: str = ""
+
+
+def run_batch(func, paths, workers=1, chunksize=None):
+    """
+    Applies func to every path, optionally spread over a process pool.
+
+    func must be a picklable top-level function (or functools.partial of one) that returns
+    a FileResult, or a list of them, instead of printing; results are printed here in input
+    order once they arrive, so output from different workers never interleaves.
+
+    Args:
+        func (Callable[[Path], FileResult | List[FileResult]]): Per-file work unit.
+        paths (Iterable[Path]): Files to process.
+        workers (int): Number of worker processes; 1 runs in-process, None uses every core.
+        chunksize (int): Files sent to a worker per task; defaults to about four chunks per worker.
+
+    Returns:
+        List[FileResult]: One or more results per file, in input order.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(paths) < 2:
+        outputs = map(func, paths)
+        executor = None
+    else:
+        chunksize = chunksize or max(1, math.ceil(len(paths) / (workers * 4)))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        outputs = executor.map(func, paths, chunksize=chunksize)
+
+    results = []
+    try:
+        for output in outputs:
+            for result in output if isinstance(output, list) else [output]:
+                if result.message:
+                    print(result.message)
+                results.append(result)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+
+def summarize(results):
+    """
+    Counts batch results per status.
+
+    Args:
+        results (List[FileResult]): Results returned by run_batch.
+
+    Returns:
+        dict: status -> number of results.
+    """
+    return dict(Counter(result.status for result in results))
@@ -0,0 +1,165 @@
+import os
+import time
+import hashlib
+import threading
+from collections import Counter
+from pathlib import Path
+
+
+def cache_key(*parts):
+    """
+    Builds a content-addressed cache key from the parts describing a request.
+
+    Args:
+        *parts: Strings (or objects with a stable str()) identifying the request.
+
+    Returns:
+        str: Hex SHA-256 digest of the parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent on-disk byte cache with per-kind TTLs and a least-recently-used size cap.
+
+    Entries live in `directory/<key[:2]>/<key>`; the first line of each file holds the
+    write timestamp. Reads touch the file's mtime, so eviction removes the entries
+    that were used least recently once the total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory, ttls=None, default_ttl=None, max_bytes=1024 ** 3):
+        """
+        Args:
+            directory (Path): Folder holding the cache entries.
+            ttls (dict): Time-to-live in seconds per entry kind (e.g. {"search": 86400}).
+            default_ttl (float): TTL for kinds missing from `ttls`; None means entries never expire.
+            max_bytes (int): Total size above which least recently used entries are evicted.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return self.directory / key[:2] / key
+
+    def _entries(self):
+        return [path for path in self.directory.glob("??/*") if path.is_file()]
+
+    def get(self, key, kind="default"):
+        """
+        Returns the cached bytes for a key, or None on a miss or an expired entry.
+
+        Args:
+            key (str): Cache key (see `cache_key`).
+            kind (str): Entry kind, selects the TTL.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                written_at = float(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            self.misses[kind] += 1
+            return None
+
+        ttl = self.ttls.get(kind, self.default_ttl)
+        if ttl is not None and time.time() - written_at > ttl:
+            with self._lock:
+                self._remove(path)
+            self.misses[kind] += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits[kind] += 1
+        return data
+
+    def set(self, key, data, kind="default"):
+        """
+        Stores bytes under a key and evicts least recently used entries if the cache is full.
+
+        Args:
+            key (str): Cache key (see `cache_key`).
+            data (bytes): Value to store.
+            kind (str): Entry kind, kept for symmetry with `get`.
+        """
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(f"{time.time()}\n".encode("ascii"))
+            f.write(data)
+        old_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._entries())
+            else:
+                self._size += path.stat().st_size - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+                self._size -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            for path in self._entries():
+                path.unlink(missing_ok=True)
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns hit/miss counters, overall and per kind.
+
+        Returns:
+            dict: {"hits", "misses", "by_kind": {kind: {"hits", "misses"}}}.
+        """
+        kinds = set(self.hits) | set(self.misses)
+        return {
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "by_kind": {kind: {"hits": self.hits[kind], "misses": self.misses[kind]} for kind in sorted(kinds)},
+        }
@@ -23,4 +23,5 @@ dir_valpapers = define_dir(dir_validation, "valpapers") # Input papers for valid
 dir_valmethods = define_dir(dir_validation, "valmethods") # Methods for validation papers
 
 
-dir_stepsjson = define_dir(dir_results, "preprocessingsteps_extracted") #JSON files containing preprocessing steps for each article
\ No newline at end of file
+dir_stepsjson = define_dir(dir_results, "preprocessingsteps_extracted") #JSON files containing preprocessing steps for each article
+dir_cache = define_dir(dir_results, "cache") # Persistent caches (E-utilities responses, ...)
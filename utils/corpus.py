@@ -0,0 +1,219 @@
+import io
+import time
+import zlib
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from utils.config import dir_results
+from utils.article import sniff_article_type
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fulltexts (
+    pmcid        TEXT PRIMARY KEY,
+    data         BLOB NOT NULL,
+    size         INTEGER NOT NULL,
+    article_type TEXT,
+    status       TEXT NOT NULL,
+    added_at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS methods (
+    pmcid    TEXT PRIMARY KEY,
+    data     BLOB NOT NULL,
+    size     INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fulltexts_article_type ON fulltexts (article_type);
+"""
+
+# Rows fetched per round trip when streaming
+FETCH_SIZE = 64
+
+
+def compress(text, level=6):
+    """Returns (zlib-compressed UTF-8 bytes, uncompressed size in bytes)."""
+    data = text.encode("utf-8")
+    return zlib.compress(data, level), len(data)
+
+
+def decompress(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+class CorpusStore:
+    """
+    Single-file corpus of full texts and methods sections, replacing one XML/TXT file per article.
+
+    Texts are stored zlib-compressed in SQLite, keyed by PMC ID, so a corpus supports random
+    access, sequential streaming and appends without listing or opening thousands of files.
+    Each full text's article-type is sniffed when it is added, which turns the research-article
+    filter into an indexed query.
+
+    A store can be passed to worker processes: it pickles as its path and reopens there.
+    """
+
+    def __init__(self, path=dir_results / "corpus.sqlite", level=6):
+        """
+        Args:
+            path (Path): SQLite database file (created if missing).
+            level (int): zlib compression level (1 fastest - 9 smallest).
+        """
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=60, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def __getstate__(self):
+        return {"path": self.path, "level": self.level}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def close(self):
+        self._conn.close()
+
+    # --- Full texts ---
+    def _fulltext_row(self, pmc_id, xml):
+        try:
+            article_type, status = sniff_article_type(io.StringIO(xml)), "ok"
+        except ET.ParseError:
+            article_type, status = None, "parse_error"
+        return (pmc_id, *compress(xml, self.level), article_type, status, time.time())
+
+    def put_fulltexts(self, items):
+        """
+        Adds or replaces full texts in one transaction.
+
+        Args:
+            items (Iterable[Tuple[str, str]]): (PMC ID, article XML) pairs.
+
+        Returns:
+            int: Number of full texts written.
+        """
+        rows = [self._fulltext_row(pmc_id, xml) for pmc_id, xml in items if xml]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO fulltexts VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def put_fulltext(self, pmc_id, xml):
+        return self.put_fulltexts([(pmc_id, xml)])
+
+    def get_fulltext(self, pmc_id):
+        """Returns the article XML for a PMC ID, or None if it is not in the corpus."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM fulltexts WHERE pmcid = ?", (pmc_id,)).fetchone()
+        return decompress(row[0]) if row else None
+
+    def __contains__(self, pmc_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM fulltexts WHERE pmcid = ?", (pmc_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fulltexts").fetchone()[0]
+
+    def pmc_ids(self, article_type=None):
+        """
+        Lists the PMC IDs in the corpus.
+
+        Args:
+            article_type (str): Only articles of this type (e.g. "research-article").
+
+        Returns:
+            List[str]: PMC IDs, sorted.
+        """
+        query, params = "SELECT pmcid FROM fulltexts", ()
+        if article_type is not None:
+            query, params = query + " WHERE article_type = ?", (article_type,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query + " ORDER BY pmcid", params)]
+
+    def _stream(self, query, params=()):
+        # A dedicated connection, so a long iteration neither holds the lock nor sees a moving cursor
+        conn = sqlite3.connect(str(self.path), timeout=60)
+        try:
+            cursor = conn.execute(query, params)
+            while rows := cursor.fetchmany(FETCH_SIZE):
+                for pmc_id, data in rows:
+                    yield pmc_id, decompress(data)
+        finally:
+            conn.close()
+
+    def iter_fulltexts(self, article_type=None):
+        """
+        Streams (PMC ID, article XML) pairs in PMC ID order, decompressing one row at a time.
+
+        Args:
+            article_type (str): Only articles of this type (e.g. "research-article").
+        """
+        if article_type is None:
+            return self._stream("SELECT pmcid, data FROM fulltexts ORDER BY pmcid")
+        return self._stream("SELECT pmcid, data FROM fulltexts WHERE article_type = ? ORDER BY pmcid",
+                            (article_type,))
+
+    def article_type_counts(self):
+        """
+        Counts full texts per article type.
+
+        Returns:
+            dict: article-type (None for missing) -> count; unparsable texts are counted under "parse_error".
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CASE WHEN status = 'ok' THEN article_type ELSE status END, COUNT(*) "
+                "FROM fulltexts GROUP BY 1").fetchall()
+        return dict(rows)
+
+    # --- Methods sections ---
+    def put_methods(self, pmc_id, text):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO methods VALUES (?, ?, ?, ?)",
+                               (pmc_id, *compress(text, self.level), time.time()))
+
+    def get_methods(self, pmc_id):
+        """Returns the methods text for a PMC ID, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM methods WHERE pmcid = ?", (pmc_id,)).fetchone()
+        return decompress(row[0]) if row else None
+
+    def iter_methods(self):
+        """Streams (PMC ID, methods text) pairs in PMC ID order."""
+        return self._stream("SELECT pmcid, data FROM methods ORDER BY pmcid")
+
+    def methods_versions(self):
+        """Returns {PMC ID: time the methods text was stored}, to detect new or replaced texts."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT pmcid, added_at FROM methods"))
+
+    # --- Migration and statistics ---
+    def import_folder(self, folder, pattern="*.xml", batch_size=200):
+        """
+        Appends a folder of one-XML-per-article files (e.g. dir_fulltexts); the file stem is the PMC ID.
+
+        Returns:
+            int: Number of files imported.
+        """
+        count, batch = 0, []
+        for path in sorted(folder.glob(pattern)):
+            batch.append((path.stem, path.read_text(encoding="utf-8")))
+            if len(batch) >= batch_size:
+                count += self.put_fulltexts(batch)
+                batch = []
+        return count + self.put_fulltexts(batch)
+
+    def stats(self):
+        """
+        Returns the number of texts and their raw and compressed sizes per table.
+
+        Returns:
+            dict: {"fulltexts": {"count", "bytes", "stored_bytes"}, "methods": {...}}.
+        """
+        stats = {}
+        with self._lock:
+            for table in ("fulltexts", "methods"):
+                count, raw, stored = self._conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM {table}").fetchone()
+                stats[table] = {"count": count, "bytes": raw, "stored_bytes": stored}
+        return stats
@@ -0,0 +1,284 @@
+import io
+import os
+import requests
+from dataclasses import dataclass, field
+import xml.etree.ElementTree as ET
+from utils.cache import DiskCache, cache_key
+from utils.ratelimit import TokenBucket
+from utils import httpclient
+from utils.config import dir_cache
+
+# Base URL of the NCBI E-utilities; override with EUTILS_BASE_URL (e.g. for a local stub server)
+EUTILS_BASE = os.getenv("EUTILS_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+
+# NCBI allows 3 requests/second per client, 10 with an API key
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+NCBI_RATE_LIMIT = 10 if NCBI_API_KEY else 3
+
+# Shared by every thread that talks to E-utilities, so concurrent callers stay under the limit
+rate_limiter = TokenBucket(NCBI_RATE_LIMIT)
+
+# Number of PMC IDs sent in a single efetch request
+EFETCH_BATCH_SIZE = 50
+
+# Number of IDs per esearch page when streaming search results
+ESEARCH_PAGE_SIZE = 500
+
+# Time-to-live (seconds) of cached responses per request kind
+CACHE_TTLS = {
+    "search": 24 * 3600,        # esearch result lists change as PMC grows
+    "mesh": 30 * 24 * 3600,     # MeSH translations change with the yearly MeSH release
+    "fulltext": 180 * 24 * 3600,
+}
+
+# Size above which the least recently used cached responses are evicted
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Shared response cache; set EUTILS_CACHE=0 to bypass it
+cache = DiskCache(dir_cache / "eutils", ttls=CACHE_TTLS, max_bytes=CACHE_MAX_BYTES) if os.getenv("EUTILS_CACHE", "1") != "0" else None
+
+# article-id types that carry the PMC identifier in efetch output
+PMC_ID_TYPES = ("pmc", "pmcid", "pmcaid", "pmc-uid")
+
+
+def eutils_request(endpoint, params, kind, method="GET", timeout=None):
+    """
+    Sends an E-utilities request, answering it from the on-disk cache when possible.
+
+    Args:
+        endpoint (str): E-utility name, e.g. "esearch" or "efetch".
+        params (dict): Query parameters.
+        kind (str): Cache kind ("search", "mesh", "fulltext"); None disables caching for the call.
+        method (str): "GET" or "POST" (POST is used for long ID lists).
+        timeout (float): Request timeout in seconds; defaults to the E-utilities host timeout.
+
+    Returns:
+        bytes: The response body.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails or returns an HTTP error.
+    """
+    key = cache_key(endpoint, sorted(params.items()))
+    if cache is not None and kind is not None:
+        data = cache.get(key, kind)
+        if data is not None:
+            return data
+
+    url = f"{EUTILS_BASE}/{endpoint}.fcgi"
+    if NCBI_API_KEY:
+        params = {**params, "api_key": NCBI_API_KEY}
+    # Every attempt takes a token, so retries of 429/5xx responses stay under the NCBI limit
+    if method == "POST":
+        response = httpclient.post(url, data=params, timeout=timeout, before_attempt=rate_limiter.acquire)
+    else:
+        response = httpclient.get(url, params=params, timeout=timeout, before_attempt=rate_limiter.acquire)
+    response.raise_for_status()
+
+    if cache is not None and kind is not None:
+        cache.set(key, response.content, kind)
+    return response.content
+
+
+def cache_stats():
+    """Returns the hit/miss counters of the E-utilities cache (empty when caching is off)."""
+    return cache.stats() if cache is not None else {}
+
+
+def normalize_pmc_id(pmc_id):
+    """
+    Normalizes a PMC ID to its numeric form ("PMC123456" -> "123456").
+
+    Args:
+        pmc_id (str): PMC ID with or without the "PMC" prefix.
+
+    Returns:
+        str: The numeric PMC ID.
+    """
+    pmc_id = str(pmc_id).strip()
+    return pmc_id[3:] if pmc_id.upper().startswith("PMC") else pmc_id
+
+
+def article_pmc_id(article):
+    """
+    Reads the PMC ID of an <article> element.
+
+    Args:
+        article (ElementTree.Element): The <article> element.
+
+    Returns:
+        str: The numeric PMC ID, or None if the article carries none.
+    """
+    for article_id in article.iterfind("./front/article-meta/article-id"):
+        if article_id.get("pub-id-type") in PMC_ID_TYPES and article_id.text:
+            return normalize_pmc_id(article_id.text)
+    return None
+
+
+def iter_articleset(xml_content):
+    """
+    Streams an efetch <pmc-articleset> response one <article> at a time with iterparse.
+
+    Each article element is cleared once the consumer moves on to the next one, so only
+    one parsed article is held in memory; serialize or process it inside the loop.
+
+    Args:
+        xml_content (str | bytes): The efetch response body.
+
+    Yields:
+        tuple: (PMC ID, <article> element).
+    """
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode("utf-8")
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(io.BytesIO(xml_content), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if elem.tag == "article" and depth <= 1:
+            pmc_id = article_pmc_id(elem)
+            if pmc_id:
+                yield pmc_id, elem
+            if elem is not root:
+                root.remove(elem)
+                elem.clear()
+
+
+def efetch_pmc_batch(pmc_ids, batch_size=EFETCH_BATCH_SIZE):
+    """
+    Fetches full-text XML for many PMC IDs with one efetch request per batch.
+
+    Articles are cached one per PMC ID, so only IDs missing from the cache are requested.
+    IDs whose batch request failed (network error, HTTP error, unparsable response) are
+    reported apart from IDs that PMC answered without an article, so callers can retry them.
+
+    Args:
+        pmc_ids (List[str]): PMC IDs to fetch.
+        batch_size (int): Number of IDs sent per efetch request.
+
+    Returns:
+        tuple: (dict of PMC ID -> article XML string, list of PMC IDs that PMC returned no
+            article for, list of PMC IDs whose batch request failed).
+    """
+    requested = list(dict.fromkeys(normalize_pmc_id(pmc_id) for pmc_id in pmc_ids))
+    articles = {}
+    if cache is not None:
+        for pmc_id in requested:
+            data = cache.get(cache_key("efetch", "pmc", pmc_id), "fulltext")
+            if data is not None:
+                articles[pmc_id] = data.decode("utf-8")
+
+    to_fetch = [pmc_id for pmc_id in requested if pmc_id not in articles]
+    failed = set()
+    for start in range(0, len(to_fetch), batch_size):
+        batch = to_fetch[start:start + batch_size]
+        try:
+            content = eutils_request("efetch", {"db": "pmc", "id": ",".join(batch), "retmode": "xml"},
+                                     kind=None, method="POST")
+            for pmc_id, article in iter_articleset(content):
+                if pmc_id in batch:
+                    articles[pmc_id] = ET.tostring(article, encoding="unicode")
+                    _cache_article(pmc_id, articles[pmc_id])
+        except (requests.exceptions.RequestException, ET.ParseError) as e:
+            print(f"[efetch] Batch {start // batch_size + 1} failed ({len(batch)} IDs): {e}")
+            failed.update(pmc_id for pmc_id in batch if pmc_id not in articles)
+
+    missing = [pmc_id for pmc_id in requested if pmc_id not in articles and pmc_id not in failed]
+    return articles, missing, [pmc_id for pmc_id in requested if pmc_id in failed]
+
+
+def _cache_article(pmc_id, xml):
+    if cache is not None:
+        cache.set(cache_key("efetch", "pmc", pmc_id), xml.encode("utf-8"), "fulltext")
+
+
+@dataclass
+class HistorySearch:
+    """
+    An esearch query kept on the NCBI history server (usehistory=y).
+
+    IDs are streamed page by page with retstart, and efetch reads articles straight
+    from the WebEnv/query_key pair, so no full ID list is held or sent. The IDs of efetch
+    batches that failed are collected in `failed` so callers can fetch them again.
+    """
+    term: str
+    db: str = "pmc"
+    count: int = None
+    webenv: str = None
+    query_key: str = None
+    failed: list = field(default_factory=list)          # PMC IDs of failed efetch batches
+    failed_ranges: list = field(default_factory=list)   # (retstart, retmax) whose IDs could not be listed either
+
+    def _esearch(self, retstart, retmax):
+        params = {"db": self.db, "term": self.term, "usehistory": "y",
+                  "retstart": retstart, "retmax": retmax, "retmode": "xml"}
+        if self.webenv:
+            params["WebEnv"] = self.webenv
+        root = ET.fromstring(eutils_request("esearch", params, kind=None))
+        if self.webenv is None:
+            self.count = int(root.findtext("Count", default="0"))
+            self.webenv = root.findtext("WebEnv")
+            self.query_key = root.findtext("QueryKey")
+        return [id_tag.text for id_tag in root.findall(".//IdList/Id")]
+
+    def id_pages(self, page_size=ESEARCH_PAGE_SIZE, max_results=None):
+        """
+        Yields the matching IDs one esearch page at a time.
+
+        Args:
+            page_size (int): IDs per esearch request.
+            max_results (int): Stop after this many IDs; None streams every hit.
+
+        Yields:
+            List[str]: The next page of IDs.
+        """
+        retstart = 0
+        while self.count is None or retstart < self.count:
+            retmax = page_size if max_results is None else min(page_size, max_results - retstart)
+            if retmax <= 0:
+                return
+            ids = self._esearch(retstart, retmax)
+            if not ids:
+                return
+            yield ids
+            retstart += len(ids)
+
+    def articles(self, batch_size=EFETCH_BATCH_SIZE, max_results=None):
+        """
+        Yields full-text articles fetched directly from the WebEnv with efetch.
+
+        Args:
+            batch_size (int): Articles per efetch request.
+            max_results (int): Stop after this many records; None fetches every hit.
+
+        Yields:
+            tuple: (PMC ID, article XML string). Batches that fail are skipped and their IDs
+                added to `failed`.
+        """
+        if self.webenv is None:
+            self._esearch(0, 0)
+        total = self.count if max_results is None else min(self.count, max_results)
+        for retstart in range(0, total, batch_size):
+            params = {"db": self.db, "WebEnv": self.webenv, "query_key": self.query_key,
+                      "retstart": retstart, "retmax": min(batch_size, total - retstart), "retmode": "xml"}
+            try:
+                content = eutils_request("efetch", params, kind=None)
+                batch = [(pmc_id, ET.tostring(article, encoding="unicode")) for pmc_id, article in iter_articleset(content)]
+            except (requests.exceptions.RequestException, ET.ParseError) as e:
+                print(f"[efetch] History batch at {retstart} failed: {e}")
+                self._record_failed(retstart, params["retmax"])
+                continue
+            for pmc_id, xml in batch:
+                _cache_article(pmc_id, xml)
+                yield pmc_id, xml
+
+    def _record_failed(self, retstart, retmax):
+        # The batch was addressed by position, so list its IDs to make them retryable
+        try:
+            self.failed.extend(normalize_pmc_id(pmc_id) for pmc_id in self._esearch(retstart, retmax))
+        except (requests.exceptions.RequestException, ET.ParseError) as e:
+            print(f"[esearch] Could not list the IDs of the failed batch at {retstart}: {e}")
+            self.failed_ranges.append((retstart, retmax))
@@ -0,0 +1,133 @@
+import time
+import random
+import threading
+import requests
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds per host; DEFAULT_TIMEOUT applies to any other host
+HOST_TIMEOUTS = {
+    "eutils.ncbi.nlm.nih.gov": (5, 60),
+    "api-inference.huggingface.co": (10, 120),
+}
+DEFAULT_TIMEOUT = (10, 60)
+
+# Responses that are retried with backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5   # seconds; doubled on every attempt
+BACKOFF_MAX = 30.0   # upper bound for a single wait, including Retry-After
+
+# Keep-alive connections kept open per host
+POOL_MAXSIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide requests.Session with keep-alive connection pooling and gzip enabled.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            _session = session
+        return _session
+
+
+def host_timeout(url):
+    """Returns the (connect, read) timeout configured for the host of a URL."""
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, response=None):
+    """
+    Returns the wait before the next attempt: the server's Retry-After if given,
+    otherwise exponential backoff with full jitter.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting at 0.
+        response (requests.Response): The failed response, if any.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    retry_after = _retry_after(response) if response is not None else None
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(method, url, retries=MAX_RETRIES, timeout=None, before_attempt=None, **kwargs):
+    """
+    Sends a request through the shared session, retrying connection errors,
+    timeouts and 429/5xx responses.
+
+    Args:
+        method (str): HTTP method.
+        url (str): Request URL.
+        retries (int): Maximum number of retries after the first attempt.
+        timeout (float | tuple): Overrides the per-host timeout.
+        before_attempt (Callable[[], None]): Called before every attempt, retries included
+            (e.g. a rate limiter's acquire, so retries also count against the limit).
+        **kwargs: Passed on to requests.Session.request.
+
+    Returns:
+        requests.Response: The last response received (callers still check its status).
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt fails without a response.
+    """
+    session = get_session()
+    timeout = timeout if timeout is not None else host_timeout(url)
+    for attempt in range(retries + 1):
+        if before_attempt is not None:
+            before_attempt()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        delay = backoff_delay(attempt, response)
+        print(f"[http] {response.status_code} from {urlsplit(url).hostname}, retrying in {delay:.1f}s")
+        response.close()
+        time.sleep(delay)
+
+
+def get(url, **kwargs):
+    """GET through the shared session (see `request`)."""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """POST through the shared session (see `request`)."""
+    return request("POST", url, **kwargs)
@@ -0,0 +1,172 @@
+import os
+import time
+import torch
+from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoModelForQuestionAnswering
+from utils.config import dir_cache
+
+try:
+    from optimum.onnxruntime import ORTModelForQuestionAnswering, ORTModelForSeq2SeqLM
+except ImportError:  # ONNX Runtime export needs `pip install optimum[onnxruntime]`
+    ORTModelForQuestionAnswering = ORTModelForSeq2SeqLM = None
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+# "auto": fp16 on GPU, fp32 on CPU. "int8": dynamic int8 quantization of the Linear layers
+# on CPU. "onnx": ONNX Runtime for BioBERT/Flan-T5 (other models fall back to "int8").
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "auto")
+
+# CPU dtype for the unquantized models; bfloat16 helps only on CPUs with native bf16 (AVX512-BF16/AMX)
+CPU_DTYPE = getattr(torch, os.getenv("CPU_DTYPE", "float32"))
+
+dir_onnx = dir_cache / "onnx"
+
+
+def pick_dtype(device=DEVICE):
+    """Returns the weight dtype for a device: float16 on GPU, CPU_DTYPE (float32 by default) on CPU."""
+    return torch.float16 if device == "cuda" else CPU_DTYPE
+
+
+def quantize_dynamic(model):
+    """
+    Applies dynamic int8 quantization to a model's Linear layers (weights stored as int8,
+    activations quantized on the fly). CPU only; the model must be in float32.
+    """
+    return torch.quantization.quantize_dynamic(model.float(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _prepare(model, mode):
+    model.eval()
+    if DEVICE == "cpu" and mode in ("int8", "onnx"):
+        return quantize_dynamic(model)
+    return model.to(DEVICE)
+
+
+def _onnx_model(ort_class, model_name):
+    if ort_class is None:
+        raise ImportError("ONNX Runtime mode needs optimum: pip install optimum[onnxruntime]")
+    export_dir = dir_onnx / model_name.replace("/", "__")
+    if (export_dir / "config.json").exists():
+        return ort_class.from_pretrained(export_dir)
+    print(f"[inference] Exporting {model_name} to ONNX in {export_dir}")
+    model = ort_class.from_pretrained(model_name, export=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def load_causal_lm(model_name, mode=INFERENCE_MODE):
+    """
+    Loads a causal LM (TinyLlama, Phi-1.5) for the current device and inference mode.
+
+    Returns:
+        tuple: (tokenizer, model).
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if DEVICE == "cuda":
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=pick_dtype(), device_map="auto")
+        return tokenizer, model.eval()
+    dtype = torch.float32 if mode in ("int8", "onnx") else pick_dtype()
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=dtype, low_cpu_mem_usage=True)
+    return tokenizer, _prepare(model, mode)
+
+
+def load_seq2seq(model_name, mode=INFERENCE_MODE):
+    """
+    Loads a seq2seq model (Flan-T5) for the current device and inference mode.
+
+    Returns:
+        tuple: (tokenizer, model); with mode="onnx" the model is an ONNX Runtime model with
+            the same generate() interface.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if mode == "onnx" and DEVICE == "cpu":
+        return tokenizer, _onnx_model(ORTModelForSeq2SeqLM, model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name, torch_dtype=torch.float32)
+    return tokenizer, _prepare(model, mode)
+
+
+def load_qa_pipeline(model_name, mode=INFERENCE_MODE):
+    """Builds a question-answering pipeline (BioBERT) for the current device and inference mode."""
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if mode == "onnx" and DEVICE == "cpu":
+        model = _onnx_model(ORTModelForQuestionAnswering, model_name)
+    else:
+        model = _prepare(AutoModelForQuestionAnswering.from_pretrained(model_name), mode)
+    return pipeline("question-answering", model=model, tokenizer=tokenizer,
+                    device=0 if DEVICE == "cuda" and mode != "onnx" else -1)
+
+
+# ============================ Benchmark ============================ #
+SAMPLE_METHODS = (
+    "EEG was recorded from 64 Ag/AgCl electrodes with a BioSemi ActiveTwo amplifier at 2048 Hz. "
+    "Participants performed a visual oddball task. Data were analysed in MATLAB with EEGLAB. "
+    "The signal was band-pass filtered between 0.1 and 40 Hz, downsampled to 256 Hz and re-referenced "
+    "to the average of both mastoids. Bad channels were identified by visual inspection and interpolated "
+    "using spherical splines. Independent component analysis (AMICA) was used to remove ocular artifacts; "
+    "components were classified with ICLabel. Epochs exceeding +/-100 microvolts were rejected."
+)
+
+
+def _time_calls(func, inputs, repeats):
+    func(inputs[0])  # warm-up
+    start = time.perf_counter()
+    outputs = [func(item) for _ in range(repeats) for item in inputs]
+    elapsed = time.perf_counter() - start
+    return outputs[:len(inputs)], elapsed / len(outputs), len(outputs) / elapsed
+
+
+def benchmark(model="biobert", modes=("auto", "int8", "onnx"), context=SAMPLE_METHODS, repeats=3):
+    """
+    Compares inference modes against the fp32 ("auto" on CPU) baseline.
+
+    Args:
+        model (str): "biobert" (question answering over eeg_prompts) or "flan-t5".
+        modes (Iterable[str]): Modes to compare; the first is the baseline.
+        context (str): Methods text the questions are asked about.
+        repeats (int): Passes over the questions per mode.
+
+    Returns:
+        List[dict]: Per mode, latency (s per question), throughput (questions/s) and
+            agreement (share of answers identical to the baseline).
+    """
+    from utils.prompts import eeg_prompts
+    questions = list(eeg_prompts.values())
+    rows, baseline = [], None
+    for mode in modes:
+        try:
+            if model == "biobert":
+                qa = load_qa_pipeline("trevorkwan/biomed_bert_squadv2", mode)
+                run = lambda question: qa(question=question, context=context)["answer"].strip()
+            else:
+                tokenizer, seq2seq = load_seq2seq("google/flan-t5-base", mode)
+
+                def run(question):
+                    inputs = tokenizer(f"Context: {context}\n\nQuestion: {question}\n\nAnswer:", return_tensors="pt",
+                                       truncation=True, max_length=1024)
+                    with torch.inference_mode():
+                        output = seq2seq.generate(**inputs, max_new_tokens=32)
+                    return tokenizer.decode(output[0], skip_special_tokens=True).strip()
+        except ImportError as e:
+            print(f"[benchmark] Skipping {mode}: {e}")
+            continue
+
+        answers, latency, throughput = _time_calls(run, questions, repeats)
+        baseline = baseline or answers
+        agreement = sum(a == b for a, b in zip(answers, baseline)) / len(answers)
+        rows.append({"mode": mode, "latency_s": round(latency, 4), "throughput_qps": round(throughput, 2),
+                     "agreement": round(agreement, 3)})
+        print(f"[benchmark] {model} {mode}: {rows[-1]}")
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    cli = argparse.ArgumentParser(description="Benchmark CPU inference modes against the fp32 baseline.")
+    cli.add_argument("--model", choices=["biobert", "flan-t5"], default="biobert")
+    cli.add_argument("--modes", nargs="+", default=["auto", "int8", "onnx"])
+    cli.add_argument("--context", help="text file with the methods section to ask about")
+    cli.add_argument("--repeats", type=int, default=3)
+    args = cli.parse_args()
+
+    context = open(args.context, encoding="utf-8").read() if args.context else SAMPLE_METHODS
+    for row in benchmark(args.model, args.modes, context, args.repeats):
+        print(row)
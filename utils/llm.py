@@ -1,52 +1,335 @@
 import os
 import re
+import copy
 import torch
+import weakref
 from dataclasses import dataclass
-from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer, GPT2Tokenizer, GPT2LMHeadModel, AutoModelForSeq2SeqLM, GPT2ForQuestionAnswering
+from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer, GPT2Tokenizer, GPT2LMHeadModel, AutoModelForSeq2SeqLM, GPT2ForQuestionAnswering, DynamicCache
+from utils.config import dir_methods
+from utils.retriever import DocumentRetriever
+from utils.passages import PassageSelector, EMBEDDING_MODEL
+from utils.models import registry
+from utils.inference import DEVICE, INFERENCE_MODE, load_causal_lm, load_seq2seq, load_qa_pipeline
+from utils.resultcache import cached_results, cached_result
 
 # ============================ BioBERT  ============================ #
 from transformers import pipeline
 
-# Initialize the BioBERT model
-biobert = pipeline('question-answering', model='trevorkwan/biomed_bert_squadv2')
+CHECKPOINT_BIOBERT = "trevorkwan/biomed_bert_squadv2"
 
-def extract_parameters(context, prompts):
+# BioBERT and the passage selector are loaded on first use by the shared model registry
+# (loaded for the device and INFERENCE_MODE in utils.inference: fp32, int8 or ONNX Runtime on CPU)
+registry.register("biobert", lambda: load_qa_pipeline(CHECKPOINT_BIOBERT))
+registry.register("passage-selector", PassageSelector)
+
+def get_biobert():
+    return registry.get("biobert")
+
+def get_passage_selector():
+    return registry.get("passage-selector")
+
+def __getattr__(name):
+    # Keeps `llm.biobert` working without loading the model at import time
+    if name == "biobert":
+        return get_biobert()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# QA batching defaults: (question, context chunk) pairs per forward pass, and the overlap
+# in tokens between the chunks a long context is split into
+QA_BATCH_SIZE = 16
+QA_DOC_STRIDE = 128
+QA_MAX_SEQ_LEN = 384
+
+def clean_answer(answer):
+    """Normalizes a BioBERT answer: empty, very short or 'not mentioned' answers become 'Not Mentioned'."""
+    answer = (answer or '').strip()
+    if not answer or len(answer) < 3 or 'not mentioned' in answer.lower():
+        return 'Not Mentioned'
+    return answer
+
+def extract_parameters_many(contexts, prompts, top_k=3, batch_size=QA_BATCH_SIZE,
+                            doc_stride=QA_DOC_STRIDE, max_seq_len=QA_MAX_SEQ_LEN):
+    '''
+    Answers every prompt for many documents with batched BioBERT inference.
+
+    All (question, context) pairs of all documents go to the pipeline in one call, which
+    splits long contexts into overlapping max_seq_len windows (doc_stride tokens apart)
+    and runs them batch_size at a time; each answer is the best span over its windows.
+
+    Args:
+        contexts (List[str]): The text contexts to process.
+        prompts (dict): A dictionary of prompts to query.
+        top_k (int): Passages given to BioBERT per prompt (see `extract_parameters`); None uses the full context.
+        batch_size (int): Question/context windows per forward pass.
+        doc_stride (int): Token overlap between the windows of a long context.
+        max_seq_len (int): Tokens per window (question included).
+
+    Returns:
+        List[Tuple[dict, dict]]: Per context, ({step: answer}, {step: confidence score});
+            failed pairs get the answer 'Error during processing' and score 0.0.
+    '''
+    # Contexts answered before with the same prompts and settings come from the result cache;
+    # contexts with a failed pair are recomputed next time
+    params = {'top_k': top_k, 'doc_stride': doc_stride, 'max_seq_len': max_seq_len,
+              'passages': EMBEDDING_MODEL if top_k else None}
+    compute = lambda missing: _answer_contexts(missing, prompts, top_k, batch_size, doc_stride, max_seq_len)
+    keep = lambda result: 'Error during processing' not in result[0].values()
+    results = cached_results(f'{CHECKPOINT_BIOBERT}@{INFERENCE_MODE}', params, prompts, contexts, compute, keep)
+    return [tuple(result) for result in results]
+
+def _answer_contexts(contexts, prompts, top_k, batch_size, doc_stride, max_seq_len):
+    steps = list(prompts)
+    pairs = []
+    for context in contexts:
+        selected = get_passage_selector().select(context, prompts, top_k=top_k) if top_k else {}
+        pairs.extend({'question': prompts[step], 'context': selected.get(step, context)} for step in steps)
+
+    qa_kwargs = dict(batch_size=batch_size, doc_stride=doc_stride, max_seq_len=max_seq_len)
+    try:
+        responses = get_biobert()(pairs, **qa_kwargs) if pairs else []
+        responses = [responses] if isinstance(responses, dict) else responses
+    except Exception as e:
+        # Retry pair by pair so one bad context does not fail the whole batch
+        print(f'Batched QA failed ({e}), retrying pair by pair')
+        responses = []
+        for pair in pairs:
+            try:
+                responses.append(get_biobert()(**pair, **qa_kwargs))
+            except Exception as e:
+                print(f'Error during processing | Question: {pair["question"][:40]} | Error: {e}')
+                responses.append(None)
+
+    results = []
+    for start in range(0, len(responses), len(steps)):
+        answers, scores = {}, {}
+        for step, response in zip(steps, responses[start:start + len(steps)]):
+            if response is None:
+                answers[step], scores[step] = 'Error during processing', 0.0
+            else:
+                answers[step], scores[step] = clean_answer(response.get('answer')), float(response.get('score', 0.0))
+        results.append((answers, scores))
+    return results
+
+def extract_parameters(context, prompts, top_k=3, return_scores=False, batch_size=QA_BATCH_SIZE,
+                       doc_stride=QA_DOC_STRIDE, max_seq_len=QA_MAX_SEQ_LEN):
     '''
     Extracts parameters from a given text context using BioBERT and specified prompts.
 
+    Each prompt is answered from the top_k passages of the context most similar to it
+    (see utils.passages.PassageSelector) rather than from the whole text, and all prompts
+    are answered in batched forward passes (see `extract_parameters_many`).
+
     Args:
         context (str): The text context to process.
         prompts (dict): A dictionary of prompts to query.
+        top_k (int): Passages given to BioBERT per prompt; None uses the full context.
+        return_scores (bool): Also return the QA confidence score of each answer.
+        batch_size (int): Question/context windows per forward pass.
+        doc_stride (int): Token overlap between the windows of a long context.
+        max_seq_len (int): Tokens per window (question included).
 
     Returns:
-        dict: A dictionary with prompt keys and extracted answers.
+        dict: A dictionary with prompt keys and extracted answers, or (answers, scores)
+            with return_scores=True.
     '''
-    results = {}
-    for step, prompt in prompts.items():
-        try:
-            response = biobert(question=prompt, context=context)
-            answer = response.get('answer', '').strip()
-            if not answer or len(answer) < 3 or 'not mentioned' in answer.lower():
-                answer = 'Not Mentioned'
-            results[step] = answer
-        except Exception as e:
-            print(f'Error during processing | Step: {step} | Error: {e}')
-            results[step] = 'Error during processing'
-    return results
+    answers, scores = extract_parameters_many([context], prompts, top_k=top_k, batch_size=batch_size,
+                                              doc_stride=doc_stride, max_seq_len=max_seq_len)[0]
+    return (answers, scores) if return_scores else answers
+
+
+
+
+# ============================ Batching helpers ============================ #
+# Documents per generate() call in the extract_batch methods
+GENERATION_BATCH_SIZE = 8
+
+def length_buckets(lengths, batch_size=GENERATION_BATCH_SIZE):
+    """
+    Groups items of similar token length so each batch needs little padding.
+
+    Args:
+        lengths (List[int]): Token length of each item.
+        batch_size (int): Maximum items per bucket.
+
+    Returns:
+        List[List[int]]: Buckets of item indices, shortest items first.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+# ============================ Registry-backed models ============================ #
+class RegistryModel:
+    """
+    Base for the extractors below: their (tokenizer, model) pair is loaded on first use by the
+    shared model registry and looked up on every access, so an evicted model is really freed.
+    """
+
+    @property
+    def model_key(self):
+        return f"{type(self).__name__}:{self.model_name}"
+
+    @property
+    def cache_id(self):
+        """Model identity in the result cache (the inference mode changes outputs, e.g. int8)."""
+        return f"{self.model_name}@{INFERENCE_MODE}"
+
+    def load(self):
+        """Returns the (tokenizer, model) pair; called by the registry."""
+        raise NotImplementedError
+
+    @property
+    def tokenizer(self):
+        return registry.get(self.model_key, self.load)[0]
+
+    @property
+    def model(self):
+        return registry.get(self.model_key, self.load)[1]
+
+    def warm(self):
+        """Starts loading the model in the background."""
+        registry.register(self.model_key, self.load)
+        return registry.warm(self.model_key)
 
 
+# Prefilled prefix caches per loaded model (prefix text -> (ids, past key/values)). Keyed
+# weakly, so a model evicted from the registry is freed together with its caches.
+_prefix_caches = weakref.WeakKeyDictionary()
+
+
+class CausalLMExtractor(RegistryModel):
+    """
+    Base for the causal-LM extractors, whose prompts start with the same instruction block for
+    every document. The block is prefilled once per loaded model and its past key/values are
+    reused by each call, so only the document-specific part of the prompt is computed.
+    """
+
+    # Prompt template; "{text}" marks where the document goes
+    prompt_template = "{text}"
+    max_length = None   # truncate the prompt to this many tokens
+
+    def prompt_parts(self, text):
+        """Returns the full prompt split into the static prefix and the document-specific suffix."""
+        prefix, suffix = self.prompt_template.split("{text}", 1)
+        return prefix, text + suffix
+
+    def encode(self, text):
+        """
+        Tokenizes prefix and suffix separately, so the ids are the same whether or not the
+        prefix cache is used.
+
+        Returns:
+            List[int]: Prompt token ids (prefix ids first).
+        """
+        prefix, suffix = self.prompt_parts(text)
+        tokenizer = self.tokenizer
+        ids = tokenizer(prefix)["input_ids"] + tokenizer(suffix, add_special_tokens=False)["input_ids"]
+        return ids[:self.max_length] if self.max_length else ids
+
+    def prefix_cache(self):
+        """Returns (prefix ids, past key/values), computed once per loaded model."""
+        model = self.model
+        prefix = self.prompt_parts("")[0]
+        caches = _prefix_caches.setdefault(model, {})
+        if prefix not in caches:
+            prefix_ids = self.tokenizer(prefix)["input_ids"]
+            with torch.no_grad():
+                past = model(torch.tensor([prefix_ids], device=DEVICE), past_key_values=DynamicCache()).past_key_values
+            caches[prefix] = (prefix_ids, past)
+        return caches[prefix]
+
+    def generate(self, text, use_prefix_cache=True, **generate_kwargs):
+        """
+        Generates a response for one document.
+
+        Args:
+            text (str): The document.
+            use_prefix_cache (bool): Reuse the prefilled instruction prefix.
+            **generate_kwargs: Passed to model.generate (e.g. max_new_tokens).
+
+        Returns:
+            str: The decoded output (prompt included).
+        """
+        compute = lambda text: self._generate(text, use_prefix_cache, **generate_kwargs)
+        return cached_result(self.cache_id, generate_kwargs, self.prompt_template, text, compute)
+
+    def _generate(self, text, use_prefix_cache, **generate_kwargs):
+        ids = self.encode(text)
+        kwargs = {"pad_token_id": self.tokenizer.eos_token_id, **generate_kwargs}
+        if use_prefix_cache:
+            prefix_ids, past = self.prefix_cache()
+            # The cache is only valid if the prompt still starts with the prefix and extends it
+            if ids[:len(prefix_ids)] == prefix_ids and len(ids) > len(prefix_ids):
+                kwargs["past_key_values"] = copy.deepcopy(past)
+        input_ids = torch.tensor([ids], device=DEVICE)
+        with torch.no_grad():
+            output = self.model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), **kwargs)
+        return self.tokenizer.decode(output[0], skip_special_tokens=True)
+
+    def generate_batch(self, texts, batch_size=GENERATION_BATCH_SIZE, **generate_kwargs):
+        """
+        Batched version of `generate` (without the prefix cache): documents are grouped by
+        token length, left-padded within each bucket and generated batch_size at a time.
+
+        Returns:
+            List[str]: Decoded outputs (prompt included), in input order.
+        """
+        compute = lambda missing: self._generate_batch(missing, batch_size, **generate_kwargs)
+        return cached_results(self.cache_id, generate_kwargs, self.prompt_template, texts, compute)
+
+    def _generate_batch(self, texts, batch_size, **generate_kwargs):
+        tokenizer, model = self.tokenizer, self.model
+        pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        kwargs = {"pad_token_id": pad_id, **generate_kwargs}
+        encoded = [self.encode(text) for text in texts]
+        responses = [None] * len(texts)
+        for bucket in length_buckets([len(ids) for ids in encoded], batch_size):
+            width = max(len(encoded[index]) for index in bucket)
+            input_ids = torch.tensor([[pad_id] * (width - len(encoded[index])) + encoded[index] for index in bucket],
+                                     device=DEVICE)
+            attention_mask = torch.tensor([[0] * (width - len(encoded[index])) + [1] * len(encoded[index])
+                                           for index in bucket], device=DEVICE)
+            with torch.no_grad():
+                output = model.generate(input_ids=input_ids, attention_mask=attention_mask, **kwargs)
+            for row, index in zip(output, bucket):
+                responses[index] = tokenizer.decode(row[width - len(encoded[index]):], skip_special_tokens=True)
+        return responses
+
+    def generation_kwargs(self):
+        """Arguments for model.generate shared by `extract_info` and `extract_batch`."""
+        return {}
+
+    def extract_batch(self, texts, batch_size=GENERATION_BATCH_SIZE):
+        """
+        Extracts EEG parameters from many documents with length-bucketed batched generation.
+
+        Args:
+            texts (List[str]): The documents.
+            batch_size (int): Documents per generate() call.
+
+        Returns:
+            List[dict]: One `extract_info` result per document, in input order.
+        """
+        return [self.parse_response(response)
+                for response in self.generate_batch(texts, batch_size, **self.generation_kwargs())]
 
 
 # ============================ GPT-2  ============================ #
 @dataclass
-class GPT2:
+class GPT2(RegistryModel):
     model_name: str = "openai-community/gpt2"
+    methods_dir: str = dir_methods
 
     def __post_init__(self):
+        """Builds the BM25 retriever over the methods texts; the model loads on first use."""
+        self.retriever = DocumentRetriever(self.methods_dir)
+
+    def load(self):
         """Loads GPT-2 model and tokenizer."""
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = GPT2ForQuestionAnswering.from_pretrained(self.model_name)
-        self.tokenizer.pad_token = self.tokenizer.eos_token  # Avoid pad_token warning
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = GPT2ForQuestionAnswering.from_pretrained(self.model_name)
+        tokenizer.pad_token = tokenizer.eos_token  # Avoid pad_token warning
+        return tokenizer, model
 
     def extract_parameters(self, input_text: str) -> str:
         """Retrieve relevant methods and extract parameters using Flan-T5."""
@@ -95,16 +378,10 @@ class GPT2:
 
 # ============================ Phi-1.5 Extractor ============================ #
 @dataclass
-class Phi15Extractor:
+class Phi15Extractor(CausalLMExtractor):
     model_name: str = "microsoft/phi-1_5"
 
-    def __post_init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=torch.float16, device_map="auto")
-
-    def extract_info(self, text):
-        """Extracts EEG parameters using Phi-1.5."""
-        prompt = f"""
+    prompt_template = """
         Extract EEG parameters from the text:
 
         Text:
@@ -117,10 +394,22 @@ class Phi15Extractor:
         - "bandpass_filters"
         - "artifact_correction"
         """
-        inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048).to("cuda" if torch.cuda.is_available() else "cpu")
-        output = self.model.generate(**inputs, max_new_tokens=300)
-        response = self.tokenizer.decode(output[0], skip_special_tokens=True)
+    max_length = 2048
 
+    def load(self):
+        # fp16 on GPU; fp32 or int8 on CPU, where fp16 is slow or unsupported
+        return load_causal_lm(self.model_name)
+
+    def generation_kwargs(self):
+        return {"max_new_tokens": 300}
+
+    def extract_info(self, text):
+        """Extracts EEG parameters using Phi-1.5."""
+        response = self.generate(text, **self.generation_kwargs())
+        return self.parse_response(response)
+
+    def parse_response(self, response):
+        """Parses the response to extract EEG parameters."""
         extracted_data = {"num_channels": "Not found", "software_used": "Not found",
                           "analysis_packages": "Not found", "bandpass_filters": "Not found",
                           "artifact_correction": "Not found"}
@@ -162,16 +451,10 @@ class SmolLM:
         return self.model(full_prompt)
 # ============================ TinyLlama ============================ #
 @dataclass
-class TinyLlama:
+class TinyLlama(CausalLMExtractor):
     model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 
-    def __post_init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=torch.float16, device_map="auto")
-
-    def extract_info(self, text):
-        """Extracts EEG parameters using TinyLlama."""
-        prompt = f"""
+    prompt_template = """
         You are an EEG research expert. Extract:
 
         - EEG Channels (e.g., 32, 64, 128)
@@ -191,13 +474,22 @@ class TinyLlama:
         Artifact Correction: <value>
         """
 
-        input_text = self.tokenizer.apply_chat_template([{"role": "user", "content": prompt}], tokenize=False)
-        inputs = self.tokenizer(input_text, return_tensors="pt").to("cuda" if torch.cuda.is_available() else "cpu")
+    def load(self):
+        # fp16 on GPU; fp32 or int8 on CPU, where fp16 is slow or unsupported
+        return load_causal_lm(self.model_name)
 
-        with torch.no_grad():
-            output = self.model.generate(**inputs, max_new_tokens=200, pad_token_id=self.tokenizer.eos_token_id)
+    def prompt_parts(self, text):
+        """Wraps the prompt in the chat template before splitting it around the document."""
+        chat = self.tokenizer.apply_chat_template([{"role": "user", "content": self.prompt_template}], tokenize=False)
+        prefix, suffix = chat.split("{text}", 1)
+        return prefix, text + suffix
+
+    def generation_kwargs(self):
+        return {"max_new_tokens": 200}
 
-        response = self.tokenizer.decode(output[0], skip_special_tokens=True)
+    def extract_info(self, text):
+        """Extracts EEG parameters using TinyLlama."""
+        response = self.generate(text, **self.generation_kwargs())
         return self.parse_response(response)
 
     def parse_response(self, response):
@@ -216,17 +508,19 @@ class TinyLlama:
 CHECKPOINT_FLAN = "google/flan-t5-large"
 
 @dataclass
-class FlanT5:
+class FlanT5(RegistryModel):
     methods_dir: str  
+    model_name = CHECKPOINT_FLAN
 
     def __post_init__(self):
-        """Initialize tokenizer, model, and document retriever."""
-        self.tokenizer = AutoTokenizer.from_pretrained(CHECKPOINT_FLAN)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(CHECKPOINT_FLAN)
-        self.retriever = DocumentRetriever(self.methods_dir)  # Initialize retriever
+        """Initialize the document retriever; tokenizer and model load on first use."""
+        self.retriever = DocumentRetriever(self.methods_dir)  # BM25 index, loaded from disk and updated incrementally
 
-    def extract_parameters(self, input_text: str) -> str:
-        """Retrieve relevant methods and extract parameters using Flan-T5."""
+    def load(self):
+        return load_seq2seq(CHECKPOINT_FLAN)
+
+    def build_prompt(self, input_text: str) -> str:
+        """Retrieve relevant methods and build the Flan-T5 extraction prompt."""
     
         # Retrieve relevant context
         retrieved_context = self.retriever.retrieve(input_text, top_k=2)
@@ -259,12 +553,51 @@ class FlanT5:
 
         {full_input}
         """
+        return prompt
 
+    def extract_parameters(self, input_text: str) -> str:
+        """Retrieve relevant methods and extract parameters using Flan-T5."""
+        prompt = self.build_prompt(input_text)
+        return cached_result(self.cache_id, self.generation_kwargs(), None, prompt, self._generate)
+
+    def _generate(self, prompt):
         # Tokenize input text
-        inputs = self.tokenizer(prompt, return_tensors="pt", max_length=1024, truncation=True)
+        inputs = self.tokenizer(prompt, return_tensors="pt", max_length=1024, truncation=True).to(DEVICE)
 
         # Generate response from model
         with torch.no_grad():
-            outputs = self.model.generate(**inputs, max_length=256, repetition_penalty=1.2, no_repeat_ngram_size=3)
+            outputs = self.model.generate(**inputs, **self.generation_kwargs())
 
         return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+    def generation_kwargs(self):
+        return {"max_length": 256, "repetition_penalty": 1.2, "no_repeat_ngram_size": 3}
+
+    def extract_batch(self, texts, batch_size=GENERATION_BATCH_SIZE):
+        """
+        Batched `extract_parameters`: prompts are grouped by token length, padded within each
+        bucket and generated batch_size at a time.
+
+        Args:
+            texts (List[str]): Input texts.
+            batch_size (int): Prompts per generate() call.
+
+        Returns:
+            List[str]: One decoded answer per text, in input order.
+        """
+        prompts = [self.build_prompt(text) for text in texts]
+        return cached_results(self.cache_id, self.generation_kwargs(), None, prompts,
+                              lambda missing: self._generate_batch(missing, batch_size))
+
+    def _generate_batch(self, prompts, batch_size):
+        tokenizer, model = self.tokenizer, self.model
+        lengths = [len(ids) for ids in tokenizer(prompts, max_length=1024, truncation=True)["input_ids"]]
+        answers = [None] * len(prompts)
+        for bucket in length_buckets(lengths, batch_size):
+            inputs = tokenizer([prompts[index] for index in bucket], return_tensors="pt", max_length=1024,
+                               truncation=True, padding=True).to(DEVICE)
+            with torch.no_grad():
+                outputs = model.generate(**inputs, **self.generation_kwargs())
+            for row, index in zip(outputs, bucket):
+                answers[index] = tokenizer.decode(row, skip_special_tokens=True)
+        return answers
@@ -0,0 +1,176 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from utils.config import dir_results
+
+# Pipeline stages in order; an article's `stage` is the furthest one it has completed
+STAGES = ("searched", "fetched", "filtered", "extracted", "parsed")
+
+# Terminal outcomes that a rerun does not retry
+DONE_STATUSES = ("parsed", "no_fulltext", "no_methods")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    keywords    TEXT NOT NULL,
+    pmc_ids     TEXT NOT NULL,
+    started_at  REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS articles (
+    pmcid           TEXT PRIMARY KEY,
+    stage           TEXT NOT NULL,
+    status          TEXT,
+    fulltext_hash   TEXT,
+    research_article INTEGER,
+    metadata        TEXT,
+    methods_hash    TEXT,
+    methods_text    TEXT,
+    result_hash     TEXT,
+    result          TEXT,
+    updated_at      REAL NOT NULL
+);
+"""
+
+
+def content_hash(text):
+    """Returns the SHA-256 hex digest of a string (None stays None)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest() if text is not None else None
+
+
+class RunManifest:
+    """
+    SQLite record of every PMC ID's progress through the review pipeline.
+
+    Each article row stores the furthest stage reached (searched -> fetched -> filtered ->
+    extracted -> parsed) with content hashes, plus the metadata, methods text and LLM
+    result needed to continue without redoing earlier stages. Runs are recorded with
+    their keywords and ID list so an interrupted run can be resumed exactly.
+    """
+
+    def __init__(self, path=dir_results / "manifest.sqlite"):
+        """
+        Args:
+            path (Path): SQLite database file (created if missing).
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    # --- Runs ---
+    def start_run(self, keywords, pmc_ids):
+        """Records a new run and returns its run_id."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (keywords, pmc_ids, started_at) VALUES (?, ?, ?)",
+                (json.dumps(list(keywords)), json.dumps(list(pmc_ids)), time.time()))
+            return cursor.lastrowid
+
+    def add_run_ids(self, run_id, pmc_ids):
+        """Appends PMC IDs to a run's ID list (used when search results are streamed)."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT pmc_ids FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            self._conn.execute("UPDATE runs SET pmc_ids = ? WHERE run_id = ?",
+                               (json.dumps(json.loads(row["pmc_ids"]) + list(pmc_ids)), run_id))
+
+    def finish_run(self, run_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def last_unfinished_run(self, keywords):
+        """
+        Returns the most recent unfinished run for the keywords.
+
+        Returns:
+            tuple: (run_id, list of PMC IDs), or None if every run for the keywords finished.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, pmc_ids FROM runs WHERE keywords = ? AND finished_at IS NULL "
+                "ORDER BY run_id DESC LIMIT 1", (json.dumps(list(keywords)),)).fetchone()
+        return (row["run_id"], json.loads(row["pmc_ids"])) if row else None
+
+    # --- Articles ---
+    def get(self, pmc_id):
+        """Returns the article's row as a dict (metadata/result decoded), or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM articles WHERE pmcid = ?", (pmc_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        for key in ("metadata", "result"):
+            if record[key] is not None:
+                record[key] = json.loads(record[key])
+        return record
+
+    def _update(self, pmc_id, stage, **fields):
+        fields["stage"] = stage
+        fields["updated_at"] = time.time()
+        columns = ", ".join(fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO articles (pmcid, {columns}) VALUES (?, {', '.join('?' * len(fields))}) "
+                f"ON CONFLICT(pmcid) DO UPDATE SET {updates}",
+                (pmc_id, *fields.values()))
+
+    def mark_searched(self, pmc_ids):
+        """Adds newly found PMC IDs without touching articles that are further along."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO articles (pmcid, stage, updated_at) VALUES (?, 'searched', ?)",
+                [(pmc_id, now) for pmc_id in pmc_ids])
+
+    def mark_fetched(self, pmc_id, xml):
+        """Records the fetch outcome; xml=None marks the article as having no full text."""
+        self._update(pmc_id, "fetched", fulltext_hash=content_hash(xml),
+                     status=None if xml is not None else "no_fulltext")
+
+    def mark_filtered(self, pmc_id, research_article):
+        self._update(pmc_id, "filtered", research_article=int(bool(research_article)))
+
+    def mark_extracted(self, pmc_id, metadata, methods_text):
+        """Stores the metadata and methods text; methods_text=None marks the article as having no methods."""
+        self._update(pmc_id, "extracted", metadata=json.dumps(metadata), methods_text=methods_text,
+                     methods_hash=content_hash(methods_text),
+                     status=None if methods_text else "no_methods")
+
+    def mark_parsed(self, pmc_id, result):
+        """Stores the LLM result; an empty result is recorded as a failure to retry."""
+        result_json = json.dumps(result) if result else None
+        self._update(pmc_id, "parsed" if result else "extracted", result=result_json,
+                     result_hash=content_hash(result_json), status="parsed" if result else "parse_failed")
+
+    def is_done(self, record):
+        """True if a record from `get` needs no more work."""
+        return record is not None and record["status"] in DONE_STATUSES
+
+    def summary(self, pmc_ids=None):
+        """
+        Counts articles per stage/status.
+
+        Args:
+            pmc_ids (List[str]): Restrict the counts to these IDs.
+
+        Returns:
+            dict: "stage/status" -> count.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT pmcid, stage, status FROM articles").fetchall()
+        wanted = set(pmc_ids) if pmc_ids is not None else None
+        counts = {}
+        for row in rows:
+            if wanted is None or row["pmcid"] in wanted:
+                key = f"{row['stage']}/{row['status'] or 'pending'}"
+                counts[key] = counts.get(key, 0) + 1
+        return counts
@@ -0,0 +1,142 @@
+import re
+import json
+import time
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import dir_cache
+from utils.eutils import eutils_request, CACHE_TTLS
+
+# Number of MeSH terms kept per keyword
+MAX_MESH_TERMS = 5
+
+
+class MeshExpander:
+    """
+    Expands search keywords with MeSH terms.
+
+    keyword -> terms lookups are memoized in memory and in a JSON file (expiring after
+    the E-utilities "mesh" TTL), the keywords of a query are resolved concurrently, and
+    the expanded query string is memoized too so repeated searches start immediately.
+    """
+
+    def __init__(self, memo_path=dir_cache / "mesh_terms.json", max_workers=8, ttl=CACHE_TTLS["mesh"]):
+        """
+        Args:
+            memo_path (Path): JSON file holding the persisted memo; None keeps it in memory only.
+            max_workers (int): Maximum number of concurrent MeSH lookups.
+            ttl (float): Seconds after which a memoized lookup is resolved again.
+        """
+        self.memo_path = memo_path
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._terms = {}
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.memo_path is None or not self.memo_path.exists():
+            return
+        try:
+            with open(self.memo_path, "r", encoding="utf-8") as f:
+                memo = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[MeSH] Ignoring unreadable memo {self.memo_path}: {e}")
+            return
+        now = time.time()
+        self._terms = {kw: entry for kw, entry in memo.get("terms", {}).items()
+                       if now - entry["resolved_at"] <= self.ttl}
+        self._queries = {query_key: query for query_key, query in memo.get("queries", {}).items()
+                         if all(kw in self._terms for kw in json.loads(query_key))}
+
+    def _save(self):
+        if self.memo_path is None:
+            return
+        with self._lock:
+            tmp_path = self.memo_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"terms": self._terms, "queries": self._queries}, f, indent=1)
+            tmp_path.replace(self.memo_path)
+
+    def lookup(self, keyword):
+        """
+        Queries the MeSH database for a keyword, bypassing the memo.
+
+        Args:
+            keyword (str): The keyword to translate.
+
+        Returns:
+            list: Up to MAX_MESH_TERMS MeSH terms, or None if the lookup failed.
+        """
+        try:
+            content = eutils_request("esearch", {"db": "mesh", "term": keyword, "retmode": "xml"}, kind="mesh", timeout=10)
+            query_translation = ET.fromstring(content).find(".//QueryTranslation")
+            if query_translation is None or not query_translation.text:
+                return []
+            return re.findall(r'"([^"]+)"\[MeSH Terms\]', query_translation.text)[:MAX_MESH_TERMS]
+        except Exception as e:
+            print(f"[MeSH] Error for '{keyword}': {e}")
+            return None
+
+    def resolve(self, keywords):
+        """
+        Returns the MeSH terms of every keyword, looking up the unmemoized ones concurrently.
+
+        Args:
+            keywords (List[str]): Keywords to expand.
+
+        Returns:
+            dict: keyword -> list of MeSH terms (empty if none were found or the lookup failed).
+        """
+        with self._lock:
+            missing = [kw for kw in dict.fromkeys(keywords) if kw not in self._terms]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                found = dict(zip(missing, pool.map(self.lookup, missing)))
+            resolved_at = time.time()
+            with self._lock:
+                for kw, terms in found.items():
+                    if terms is not None:  # failed lookups are retried next time
+                        self._terms[kw] = {"terms": terms, "resolved_at": resolved_at}
+            self._save()
+
+        with self._lock:
+            return {kw: list(self._terms[kw]["terms"]) if kw in self._terms else [] for kw in keywords}
+
+    def terms(self, keyword):
+        """Returns the (memoized) MeSH terms for a single keyword."""
+        return self.resolve([keyword])[keyword]
+
+    def build_query(self, keywords):
+        """
+        Builds the MeSH-expanded query: one (keyword OR MeSH terms...) group per keyword, ANDed.
+
+        Args:
+            keywords (List[str]): Search keywords.
+
+        Returns:
+            str: The expanded esearch query, memoized per keyword list.
+        """
+        query_key = json.dumps(list(keywords))
+        with self._lock:
+            if query_key in self._queries:
+                return self._queries[query_key]
+
+        mesh = self.resolve(keywords)
+        parts = []
+        for kw in keywords:
+            terms = [f'"{kw}"[Title/Abstract]'] + [f'"{m}"[MeSH Terms]' for m in mesh[kw]]
+            parts.append("(" + " OR ".join(terms) + ")")
+        query = " AND ".join(parts)
+
+        with self._lock:
+            if all(kw in self._terms for kw in keywords):
+                self._queries[query_key] = query
+        self._save()
+        return query
+
+
+# Shared expander used by pubmed.py and utils/article_fetcher.py
+mesh_expander = MeshExpander()
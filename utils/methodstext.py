@@ -1,6 +1,8 @@
 import os
-import xml.etree.ElementTree as ET
-from thefuzz import fuzz
+from functools import partial
+from utils.sectiontitles import MethodsTitleClassifier
+from utils.article import iter_articles, section_text
+from utils.batch import FileResult, run_batch, summarize
 
 # List of section titles to match (case insensitive)
 METHODS_TITLES = {"methods", "materials and methods", "methodology", "method"}
@@ -8,6 +10,9 @@ METHODS_TITLES = {"methods", "materials and methods", "methodology", "method"}
 # Minimum similarity score for fuzzy matching
 SIMILARITY_THRESHOLD = 80
 
+# Shared classifier: sec-type="methods" check, exact/memoized title lookups, batched fuzzy fallback
+title_classifier = MethodsTitleClassifier(METHODS_TITLES, SIMILARITY_THRESHOLD, sec_types={"methods"})
+
 def is_methods_section(title):
     """
     Determines if a given title matches a methods-related section
@@ -19,7 +24,7 @@ def is_methods_section(title):
     Returns:
         bool: True if the title is likely a methods section, False otherwise.
     """
-    return any(fuzz.ratio(title.lower().strip(), ref) >= SIMILARITY_THRESHOLD for ref in METHODS_TITLES)
+    return title_classifier.is_methods_title(title)
 
 def extract_text_from_section(section):
     """
@@ -31,16 +36,50 @@ def extract_text_from_section(section):
     Returns:
         str: Extracted text content.
     """
-    section_text = []
-    for elem in section.iter():
-        if elem.tag not in ["title", "sec"]:  # Avoid nested sections
-            if elem.text:
-                section_text.append(elem.text.strip())
-            if elem.tail:
-                section_text.append(elem.tail.strip())
-    return "\n".join(filter(None, section_text)).strip()
-
-def extract_methods(input_folder, output_folder):
+    return section_text(section)
+
+def is_methods_sec(title, sec):
+    """
+    Section predicate for ParsedArticle: the <sec> is tagged sec-type="methods"
+    or its title matches a methods-related title.
+    """
+    return title_classifier(title, sec)
+
+def extract_methods_file(file_path, output_folder):
+    """
+    Extracts the methods sections of one full-text XML file and saves them as text files.
+
+    The file is streamed with iterparse, so large or multi-article files are handled in
+    flat memory; every article after the first one gets its PMC ID appended to the output name.
+
+    Args:
+        file_path (Path): The full-text XML file.
+        output_folder (Path): Directory where extracted methods will be saved.
+
+    Returns:
+        List[FileResult]: One result per saved methods file, or a single "skipped"/"error" result.
+    """
+    file_name = file_path.name
+    results = []
+    try:
+        # Stream the file: only front matter and methods sections are kept in memory
+        for index, article in enumerate(iter_articles(file_path, is_methods_sec)):
+            methods_text = article.methods_text(is_methods_sec, extract_text_from_section)
+
+            # Save extracted methods
+            if methods_text:
+                pmc_id = file_name.replace(".xml", "") if index == 0 else f"{file_name.replace('.xml', '')}_{article.pmc_id}"
+                output_file = output_folder / f"methods_{pmc_id}.txt"
+                with open(output_file, "w", encoding="utf-8") as txt_file:
+                    txt_file.write(methods_text)
+                results.append(FileResult(file_name, "saved", f"Extracted methods from {file_name} → {output_file}"))
+
+    except Exception as e:
+        return [FileResult(file_name, "error", f"Error processing file {file_name}: {e}")]
+
+    return results or [FileResult(file_name, "skipped", f"No methods section found in {file_name}")]
+
+def extract_methods(input_folder, output_folder, workers=1, chunksize=None):
     """
     Extracts methods-related sections from full-text XML files in the given input folder
     and saves them as text files in the specified output folder.
@@ -48,40 +87,14 @@ def extract_methods(input_folder, output_folder):
     Args:
         input_folder (Path): Directory containing the full-text XML files.
         output_folder (Path): Directory where extracted methods will be saved.
+        workers (int): Worker processes to spread the files over; None uses every core.
+        chunksize (int): Files per work unit sent to a worker (see utils.batch.run_batch).
 
     Returns:
-        None
+        List[FileResult]: Per-file status, in file name order.
     """
-    for file_name in os.listdir(input_folder):
-        if file_name.endswith(".xml"):
-            file_path = input_folder / file_name
-            try:
-                tree = ET.parse(file_path)
-                root = tree.getroot()
-
-                methods_text = []
-                
-                # Find all <sec> sections
-                for sec in root.findall(".//sec"):
-                    # Check for `sec-type="methods"`
-                    if sec.get("sec-type") == "methods":
-                        methods_text.append(extract_text_from_section(sec))
-                        continue
-
-                    # Check section title
-                    title_element = sec.find("title")
-                    if title_element is not None and is_methods_section(title_element.text.strip()):
-                        methods_text.append(extract_text_from_section(sec))
-
-                # Save extracted methods
-                if methods_text:
-                    pmc_id = file_name.replace(".xml", "")
-                    output_file = output_folder / f"methods_{pmc_id}.txt"
-                    with open(output_file, "w", encoding="utf-8") as txt_file:
-                        txt_file.write("\n\n".join(methods_text))
-                    print(f"Extracted methods from {file_name} → {output_file}")
-                else:
-                    print(f"No methods section found in {file_name}")
-
-            except Exception as e:
-                print(f"Error processing file {file_name}: {e}")
+    xml_files = sorted(input_folder / file_name for file_name in os.listdir(input_folder) if file_name.endswith(".xml"))
+    results = run_batch(partial(extract_methods_file, output_folder=output_folder), xml_files,
+                        workers=workers, chunksize=chunksize)
+    print(f"Methods extraction summary: {summarize(results)}")
+    return results
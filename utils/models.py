@@ -0,0 +1,128 @@
+import os
+import gc
+import threading
+from collections import OrderedDict
+
+# Models kept loaded at once before the least recently used one is released (0 = no limit)
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", "2"))
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of lazily loaded models.
+
+    A model is loaded by its registered loader the first time `get` asks for it and shared
+    by every caller afterwards. Concurrent first calls wait for a single load. `warm` starts
+    loads in the background, and once more than `max_loaded` models are in memory the least
+    recently used one is released (and loaded again if it is needed later).
+    """
+
+    def __init__(self, max_loaded=MAX_LOADED_MODELS):
+        """
+        Args:
+            max_loaded (int): Maximum number of models held at once; 0 or None keeps every model.
+        """
+        self.max_loaded = max_loaded
+        self._loaders = {}
+        self._models = OrderedDict()    # name -> model, least recently used first
+        self._load_locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        Registers (or replaces) the loader of a model; nothing is loaded yet.
+
+        Args:
+            name (str): Registry key, e.g. "biobert" or "causal-lm:microsoft/phi-1_5".
+            loader (Callable[[], Any]): Builds the model (or a (tokenizer, model) tuple).
+        """
+        with self._lock:
+            self._loaders[name] = loader
+
+    def get(self, name, loader=None):
+        """
+        Returns a model, loading it on first use.
+
+        Args:
+            name (str): Registry key.
+            loader (Callable[[], Any]): Registers this loader first if the name is unknown.
+
+        Raises:
+            KeyError: If no loader is registered for the name.
+        """
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+            if loader is not None:
+                self._loaders.setdefault(name, loader)
+            if name not in self._loaders:
+                raise KeyError(f"No model registered as '{name}'")
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name]
+                loader = self._loaders[name]
+            print(f"[models] Loading {name}...")
+            model = loader()
+            with self._lock:
+                self._models[name] = model
+                evicted = self._evict_over_limit()
+        if evicted:
+            self._release(evicted)
+        return model
+
+    def warm(self, *names):
+        """
+        Loads models in a background thread so they are ready when first needed.
+
+        Returns:
+            threading.Thread: The loading thread (join it to wait for the models).
+        """
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"[models] Warming {name} failed: {e}")
+
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _evict_over_limit(self):
+        evicted = []
+        while self.max_loaded and len(self._models) > self.max_loaded:
+            name, _ = self._models.popitem(last=False)
+            evicted.append(name)
+        return evicted
+
+    def _release(self, names):
+        print(f"[models] Released {', '.join(names)}")
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def evict(self, name=None):
+        """Releases one model, or every model when name is None."""
+        with self._lock:
+            names = [name] if name is not None else list(self._models)
+            names = [name for name in names if self._models.pop(name, None) is not None]
+        if names:
+            self._release(names)
+
+    def loaded(self):
+        """Returns the names of the models in memory, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+
+# Shared registry used by utils.llm and utils.passages
+registry = ModelRegistry()
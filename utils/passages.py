@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import threading
+import hashlib
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+from utils.config import dir_cache
+
+# Small sentence-embedding model; any encoder checkpoint works with mean pooling
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Size above which the least recently used cached passage matrices are evicted
+PASSAGE_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+# Sentence boundary, except after common abbreviations ("e.g. ICA", "et al. 2019", "Fig. 2")
+SENTENCE_END = re.compile(r"(?<!\be\.g\.)(?<!\bi\.e\.)(?<!\bal\.)(?<!\bFig\.)(?<!\bvs\.)(?<!\bca\.)(?<!\bapprox\.)"
+                          r"(?<=[.!?])\s+(?=[A-Z0-9(\[])|\n{2,}")
+
+
+def split_sentences(text):
+    """Splits text into sentences at ., ! or ? followed by a capital/digit, and at blank lines."""
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence and sentence.strip()]
+
+
+def split_passages(text, window=3, stride=2):
+    """
+    Splits text into overlapping windows of consecutive sentences.
+
+    Args:
+        text (str): Methods text.
+        window (int): Sentences per passage.
+        stride (int): Sentences between the starts of consecutive passages (< window overlaps).
+
+    Returns:
+        List[str]: Passages in document order.
+    """
+    sentences = split_sentences(text)
+    if len(sentences) <= window:
+        return [" ".join(sentences)] if sentences else []
+    starts = range(0, len(sentences) - window + stride, stride)
+    return [" ".join(sentences[start:start + window]) for start in starts]
+
+
+class PassageSelector:
+    """
+    Picks the passages of a text that are most relevant to each prompt, so QA and generation
+    models get a short, focused context instead of the whole (or a blindly truncated) text.
+
+    Passages are embedded once per text, in batches, into a float32 matrix that is saved as
+    .npy under `cache_dir` and memory-mapped on reuse; the least recently used ones are
+    evicted once the folder exceeds `cache_max_bytes`. Prompt embeddings are memoized, and
+    the top-k passages for all prompts come from a single matrix product.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=32, window=3, stride=2,
+                 cache_dir=dir_cache / "passages", cache_max_bytes=PASSAGE_CACHE_MAX_BYTES, device=None):
+        """
+        Args:
+            model_name (str): Hugging Face encoder used for the embeddings.
+            batch_size (int): Texts embedded per forward pass.
+            window (int): Sentences per passage (see `split_passages`).
+            stride (int): Sentence step between passages.
+            cache_dir (Path): Folder for the memory-mapped passage matrices; None disables it.
+            cache_max_bytes (int): Size of cache_dir above which least recently used entries are evicted.
+            device (str): Torch device; defaults to CUDA when available.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.window = window
+        self.stride = stride
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self._cache_size = None
+        self._cache_lock = threading.Lock()
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(self.device).eval()
+        self._prompt_embeddings = {}
+
+    def embed(self, texts):
+        """
+        Embeds texts in batches (mean-pooled last hidden state, L2-normalized).
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), embedding size).
+        """
+        chunks = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                batch = self.tokenizer(texts[start:start + self.batch_size], padding=True, truncation=True,
+                                       max_length=256, return_tensors="pt").to(self.device)
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                chunks.append(torch.nn.functional.normalize(pooled, dim=-1).float().cpu().numpy())
+        if not chunks:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        return np.concatenate(chunks)
+
+    def passage_matrix(self, text):
+        """
+        Returns the passages of a text and their embeddings, memory-mapped from the cache when available.
+
+        Returns:
+            tuple: (List[str] passages, np.ndarray embeddings of shape (len(passages), size)).
+        """
+        key = hashlib.sha256(f"{self.model_name}\0{self.window}\0{self.stride}\0{text}".encode("utf-8")).hexdigest()
+        if self.cache_dir is not None:
+            matrix_path = self.cache_dir / f"{key}.npy"
+            passages_path = self.cache_dir / f"{key}.json"
+            # The matrix is written last, so its presence means the passages file is complete
+            if matrix_path.exists():
+                try:
+                    with open(passages_path, "r", encoding="utf-8") as f:
+                        passages = json.load(f)
+                    matrix = np.load(matrix_path, mmap_mode="r")
+                    os.utime(matrix_path)
+                    return passages, matrix
+                except (OSError, ValueError):
+                    pass    # evicted or replaced meanwhile; recompute
+
+        passages = split_passages(text, self.window, self.stride)
+        matrix = self.embed(passages)
+        if self.cache_dir is not None:
+            self._write_atomic(passages_path, json.dumps(passages).encode("utf-8"))
+            self._write_atomic(matrix_path, matrix)
+            self._account(passages_path, matrix_path)
+        return passages, matrix
+
+    def _write_atomic(self, path, data):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            if isinstance(data, np.ndarray):
+                np.save(f, data)
+            else:
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    def _account(self, *paths):
+        """Adds newly written entries to the cache size and evicts the least recently used ones if needed."""
+        with self._cache_lock:
+            if self._cache_size is None:
+                self._cache_size = sum(path.stat().st_size for pattern in ("*.npy", "*.json")
+                                       for path in self.cache_dir.glob(pattern))
+            else:
+                self._cache_size += sum(path.stat().st_size for path in paths)
+            if self.cache_max_bytes and self._cache_size > self.cache_max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for matrix_path in self.cache_dir.glob("*.npy"):
+            passages_path = matrix_path.with_suffix(".json")
+            try:
+                stat = matrix_path.stat()
+                size = stat.st_size + (passages_path.stat().st_size if passages_path.exists() else 0)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, matrix_path, passages_path))
+        entries.sort()
+
+        self._cache_size = sum(size for _, size, _, _ in entries)
+        target = self.cache_max_bytes * 0.9
+        for _, size, matrix_path, passages_path in entries:
+            if self._cache_size <= target:
+                break
+            # Matrix first: without it the entry counts as missing even if the passages remain
+            matrix_path.unlink(missing_ok=True)
+            passages_path.unlink(missing_ok=True)
+            self._cache_size -= size
+
+    def prompt_matrix(self, prompts):
+        """Embeds prompts, reusing the embeddings of prompts seen before."""
+        missing = [prompt for prompt in dict.fromkeys(prompts) if prompt not in self._prompt_embeddings]
+        if missing:
+            self._prompt_embeddings.update(zip(missing, self.embed(missing)))
+        return np.stack([self._prompt_embeddings[prompt] for prompt in prompts])
+
+    def select(self, text, prompts, top_k=3, separator=" "):
+        """
+        Builds a short context per prompt from the text's most similar passages.
+
+        Args:
+            text (str): Methods (or full article) text.
+            prompts (dict | List[str]): Prompts keyed by name (e.g. eeg_prompts), or a list of questions.
+            top_k (int): Passages per prompt; they are joined in document order.
+            separator (str): Joins the selected passages.
+
+        Returns:
+            dict: prompt key (or question) -> context string. Texts with at most top_k
+                passages are returned whole.
+        """
+        items = list(prompts.items()) if isinstance(prompts, dict) else [(prompt, prompt) for prompt in prompts]
+        if not items:
+            return {}
+        passages, matrix = self.passage_matrix(text)
+        if len(passages) <= top_k:
+            return {key: text for key, _ in items}
+
+        scores = np.asarray(matrix) @ self.prompt_matrix([prompt for _, prompt in items]).T   # (passages, prompts)
+        best = np.argpartition(-scores, top_k - 1, axis=0)[:top_k]
+        return {key: separator.join(passages[index] for index in sorted(best[:, column]))
+                for column, (key, _) in enumerate(items)}
@@ -0,0 +1,103 @@
+import io
+import os
+import re
+import math
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+from utils.sectiontitles import MethodsTitleClassifier
+from utils.methodstext import title_classifier
+
+# PDFs with fewer pages are extracted in-process (starting workers costs more than it saves)
+MIN_PAGES_FOR_POOL = 8
+
+# Headings that end a methods section
+END_TITLES = {"results", "results and discussion", "discussion", "conclusion", "conclusions",
+              "references", "acknowledgements", "acknowledgments", "data availability", "funding"}
+end_classifier = MethodsTitleClassifier(END_TITLES, 85)
+
+# Section numbering in front of a heading ("2.", "2.1", "II.", "B)")
+HEADING_NUMBER = re.compile(r"^(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-Z][.)])\s+")
+
+# Longest line still treated as a heading
+MAX_HEADING_WORDS = 6
+
+
+def _extract_pages(data, page_numbers):
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [reader.pages[number].extract_text() or "" for number in page_numbers]
+
+
+def extract_pages(source, workers=None):
+    """
+    Extracts the text of every page of a PDF, spreading the pages over a process pool.
+
+    Args:
+        source (bytes | str | Path | file object): The PDF.
+        workers (int): Worker processes; None uses every core, 1 extracts in-process.
+
+    Returns:
+        List[str]: Text per page, in page order ("" for pages without text).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    elif hasattr(source, "read"):
+        data = source.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+
+    page_count = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    workers = min(workers or os.cpu_count() or 1, page_count)
+    if workers <= 1 or page_count < MIN_PAGES_FOR_POOL:
+        return _extract_pages(data, range(page_count))
+
+    # One contiguous page range per task; each worker parses the PDF once for its range
+    chunk = math.ceil(page_count / workers)
+    ranges = [range(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = executor.map(_extract_pages, [data] * len(ranges), ranges)
+        return [text for part in parts for text in part]
+
+
+def pdf_text(source, workers=None):
+    """Returns the text of a PDF, one block per page with text, joined by newlines."""
+    return "\n".join(text for text in extract_pages(source, workers) if text) + "\n"
+
+
+def _heading(line):
+    """Returns the heading text of a line that looks like a section heading, else None."""
+    line = HEADING_NUMBER.sub("", line.strip()).rstrip(":").strip()
+    if not line or len(line.split()) > MAX_HEADING_WORDS or not line[0].isalpha():
+        return None
+    return line
+
+
+def find_methods_region(text, classifier=title_classifier, min_chars=200):
+    """
+    Locates the methods section of PDF text: from a heading line that the XML methods-title
+    classifier accepts up to the next results/discussion/references-type heading.
+
+    Args:
+        text (str): Text of the whole PDF.
+        classifier (MethodsTitleClassifier): Methods heading matcher (the one used for XML sections).
+        min_chars (int): Regions shorter than this (e.g. a "Methods" entry in a table of
+            contents) are ignored.
+
+    Returns:
+        str: The longest methods region found, or None if there is none.
+    """
+    lines = text.splitlines()
+    headings = [(index, heading) for index, line in enumerate(lines) if (heading := _heading(line))]
+    is_methods = classifier.classify_many(heading for _, heading in headings)
+    is_end = end_classifier.classify_many(heading for _, heading in headings)
+
+    best = None
+    for position, (start, _) in enumerate(headings):
+        if not is_methods[position]:
+            continue
+        end = next((index for (index, _), ends in zip(headings[position + 1:], is_end[position + 1:]) if ends),
+                   len(lines))
+        region = "\n".join(lines[start + 1:end]).strip()
+        if len(region) >= min_chars and (best is None or len(region) > len(best)):
+            best = region
+    return best
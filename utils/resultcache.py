@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+from utils.cache import DiskCache, cache_key
+from utils.config import dir_cache
+
+# Bump when extraction code changes in a way the hashed templates and parameters do not capture
+# (e.g. a new answer post-processing step); every existing entry is then ignored
+RESULT_CACHE_VERSION = 1
+
+# Size above which the least recently used results are evicted
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+# Shared by every extractor (LLMParser, BioBERT QA, the local generators, the Streamlit app);
+# set RESULT_CACHE=0 to bypass it
+cache = DiskCache(dir_cache / "results", max_bytes=RESULT_CACHE_MAX_BYTES) if os.getenv("RESULT_CACHE", "1") != "0" else None
+
+
+def _stable_json(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=lambda item: sorted(item) if isinstance(item, (set, frozenset)) else str(item))
+
+
+def template_version(*templates):
+    """
+    Hashes the prompt templates a result depends on (JSON_TEMPLATE, a utils.prompts dict,
+    a prompt string), so editing any of them invalidates the results built from it.
+
+    Returns:
+        str: Short hex digest.
+    """
+    return hashlib.sha256(_stable_json(templates).encode("utf-8")).hexdigest()[:16]
+
+
+def result_key(model_id, params, template, text):
+    """
+    Builds the cache key of one inference result.
+
+    Args:
+        model_id (str): Model checkpoint, plus anything that changes its outputs (e.g. the inference mode).
+        params (dict): Generation/QA parameters that affect the output.
+        template: Prompt template(s) the input is wrapped in (see `template_version`).
+        text (str): The input (document, context or full prompt).
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return cache_key(RESULT_CACHE_VERSION, model_id, _stable_json(params), template_version(template), text_hash)
+
+
+def cached_results(model_id, params, template, texts, compute, keep=None):
+    """
+    Returns one result per input, running `compute` only on inputs without a cached result.
+
+    Args:
+        model_id (str): See `result_key`.
+        params (dict): See `result_key`.
+        template: See `result_key`.
+        texts (List[str]): Inputs.
+        compute (Callable[[List[str]], List]): Computes the results of the missing inputs, in
+            order (batched by the caller as it sees fit). Results must be JSON-serializable.
+        keep (Callable[[Any], bool]): Returns False for results that must not be cached
+            (e.g. failed calls); by default every result is cached.
+
+    Returns:
+        List: Results in input order. Cached results come back as decoded JSON, so tuples
+            are returned as lists.
+    """
+    if cache is None:
+        return list(compute(list(texts)))
+
+    keys = [result_key(model_id, params, template, text) for text in texts]
+    results, missing = [None] * len(texts), {}
+    for index, key in enumerate(keys):
+        data = cache.get(key, model_id)
+        if data is not None:
+            results[index] = json.loads(data)
+        else:
+            missing.setdefault(key, []).append(index)
+
+    if missing:
+        computed = compute([texts[indices[0]] for indices in missing.values()])
+        for (key, indices), result in zip(missing.items(), computed):
+            for index in indices:
+                results[index] = result
+            if keep is None or keep(result):
+                cache.set(key, json.dumps(result, ensure_ascii=False).encode("utf-8"), model_id)
+    return results
+
+
+def cached_result(model_id, params, template, text, compute, keep=None):
+    """Single-input `cached_results`; `compute` takes and returns one item."""
+    return cached_results(model_id, params, template, [text], lambda texts: [compute(texts[0])], keep)[0]
+
+
+def cache_stats():
+    """Returns the hit/miss counters per model of the result cache (empty when caching is off)."""
+    return cache.stats() if cache is not None else {}
@@ -1,10 +1,15 @@
 import os
 import json
 import pandas as pd
+from utils.corpus import CorpusStore
 
 # Save as XML
 def save_xml(pmc_id, full_text, save_folder):
-    if full_text:
+    """Saves a full text as <save_folder>/<pmc_id>.xml, or appends it to save_folder if it is a CorpusStore."""
+    if full_text and isinstance(save_folder, CorpusStore):
+        save_folder.put_fulltext(pmc_id, full_text)
+        print(f"Saved full text for PMC ID {pmc_id} to {save_folder.path}")
+    elif full_text:
         file_path = os.path.join(save_folder, f"{pmc_id}.xml")
         try:
             with open(file_path, 'w', encoding='utf-8') as file:
@@ -0,0 +1,103 @@
+from thefuzz import fuzz
+
+try:
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+except ImportError:  # thefuzz < 0.20 does not pull in rapidfuzz
+    rf_process = None
+
+# Titles memoized per classifier before the memo is reset
+MEMO_MAX_SIZE = 100_000
+
+
+class MethodsTitleClassifier:
+    """
+    Decides whether a section title names a methods section.
+
+    A title matches when its best fuzz.ratio against the reference titles reaches the
+    threshold. Checks run cheapest first: the section's sec-type attribute, an exact
+    normalized match, the memo of titles seen before, and finally the fuzzy scorer,
+    which `classify_many` runs for all unseen titles of a document in one batch.
+    """
+
+    def __init__(self, titles, threshold, sec_types=()):
+        """
+        Args:
+            titles (Iterable[str]): Lower-case reference titles (e.g. "materials and methods").
+            threshold (int): Minimum fuzz.ratio score (0-100) for a match.
+            sec_types (Iterable[str]): sec-type attribute values that mark a methods section
+                regardless of its title.
+        """
+        self.titles = frozenset(titles)
+        self.threshold = threshold
+        self.sec_types = frozenset(sec_types)
+        self._choices = sorted(self.titles)
+        self._memo = {}
+
+    @staticmethod
+    def normalize(title):
+        """Normalizes a title the same way before exact lookup and fuzzy scoring."""
+        return title.strip().lower()
+
+    def _fuzzy_scores(self, normalized_titles):
+        if rf_process is not None:
+            # One C-level pass over the reference titles per title; fuzz.ratio rounds
+            # rapidfuzz's float score to an int, so do the same for identical results
+            return [int(round(rf_process.extractOne(title, self._choices, scorer=rf_fuzz.ratio, processor=None)[1]))
+                    for title in normalized_titles]
+        return [max(fuzz.ratio(title, ref) for ref in self._choices) for title in normalized_titles]
+
+    def _remember(self, normalized_titles, scores):
+        if len(self._memo) + len(normalized_titles) > MEMO_MAX_SIZE:
+            self._memo.clear()
+        self._memo.update(zip(normalized_titles, scores))
+
+    def score(self, title):
+        """
+        Returns the best fuzz.ratio score of a title against the reference titles.
+
+        Args:
+            title (str): The section title.
+
+        Returns:
+            int: Score from 0 to 100.
+        """
+        normalized = self.normalize(title)
+        if normalized in self.titles:
+            return 100
+        if normalized not in self._memo:
+            self._remember([normalized], self._fuzzy_scores([normalized]))
+        return self._memo[normalized]
+
+    def classify_many(self, titles):
+        """
+        Classifies many titles at once, scoring all unseen ones in a single batched call.
+
+        Args:
+            titles (Iterable[str]): Section titles (None entries are allowed).
+
+        Returns:
+            list: One bool per title.
+        """
+        titles = list(titles)
+        unseen = list(dict.fromkeys(
+            normalized for title in titles if title
+            if (normalized := self.normalize(title)) not in self.titles and normalized not in self._memo))
+        if unseen:
+            self._remember(unseen, self._fuzzy_scores(unseen))
+        return [self.is_methods_title(title) for title in titles]
+
+    def is_methods_title(self, title):
+        """Returns True if the title is (fuzzily) one of the reference methods titles."""
+        return bool(title) and self.score(title) >= self.threshold
+
+    def __call__(self, title, sec=None):
+        """
+        Section predicate for ParsedArticle and iter_articles.
+
+        Args:
+            title (str): The section title, or None.
+            sec (ElementTree.Element): The <sec> element, used for the sec-type check.
+        """
+        if sec is not None and self.sec_types and sec.get("sec-type") in self.sec_types:
+            return True
+        return self.is_methods_title(title)